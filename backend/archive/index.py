@@ -0,0 +1,169 @@
+'''
+Business: Перенос выполненных и отгруженных заявок и старой истории остатков в архивные таблицы, очистка просроченных ключей идемпотентности (запуск по расписанию)
+Args: event - dict с httpMethod, body (days - возраст заявок в днях, inventory_days - возраст истории остатков, batch_size,
+      change_log_hours - сколько часов хранить журнал ленты изменений)
+Returns: HTTP response с количеством перенесённых строк, удалённых просроченных ключей идемпотентности и записей журнала ленты,
+         а также заявок, оставленных в рабочей таблице из-за номера, который уже есть в архиве (order_number_conflicts)
+'''
+
+import json
+import os
+import psycopg2
+from typing import Dict, Any
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    database_url = os.environ.get('DATABASE_URL')
+
+    try:
+        body_data = json.loads(event.get('body') or '{}')
+        days = int(body_data.get('days', 90))
+        inventory_days = int(body_data.get('inventory_days', 365))
+        batch_size = int(body_data.get('batch_size', 5000))
+        # Не меньше MAX_CURSOR_AGE в backend/feed (24 ч): курсор ленты, выданный раньше, получает reset
+        change_log_hours = max(int(body_data.get('change_log_hours', 48)), 24)
+
+        conn = psycopg2.connect(database_url)
+        cur = conn.cursor()
+
+        orders_moved = 0
+        items_moved = 0
+        inventory_moved = 0
+
+        # Небольшие пачки держат транзакции и блокировки короткими
+        while True:
+            # Перенос в архив не должен рассылать уведомления ленты изменений
+            cur.execute("SELECT set_config('oms.skip_notify', 'on', true)")
+            cur.execute("""
+                WITH moved AS (
+                    DELETE FROM t_p435659_order_management_sys.orders
+                    WHERE id IN (
+                        SELECT o.id FROM t_p435659_order_management_sys.orders o
+                        WHERE o.status IN ('completed', 'shipped')
+                          AND o.updated_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                          -- Заявка с номером, уже занятым в архиве, нарушила бы его уникальность и остановила бы весь перенос
+                          AND NOT EXISTS (
+                              SELECT 1 FROM t_p435659_order_management_sys.orders_archive a
+                              WHERE a.order_number = o.order_number
+                          )
+                        ORDER BY o.updated_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                ), moved_items AS (
+                    DELETE FROM t_p435659_order_management_sys.order_items
+                    WHERE order_id IN (SELECT id FROM moved)
+                    RETURNING *
+                ), archived AS (
+                    INSERT INTO t_p435659_order_management_sys.orders_archive
+                    SELECT * FROM moved
+                    RETURNING 1
+                ), archived_items AS (
+                    INSERT INTO t_p435659_order_management_sys.order_items_archive
+                    SELECT * FROM moved_items
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM archived), (SELECT COUNT(*) FROM archived_items)
+            """, (days, batch_size))
+            batch_orders, batch_items = cur.fetchone()
+            conn.commit()
+            orders_moved += batch_orders
+            items_moved += batch_items
+            if batch_orders < batch_size:
+                break
+
+        while True:
+            cur.execute("""
+                WITH moved AS (
+                    DELETE FROM t_p435659_order_management_sys.material_inventory
+                    WHERE id IN (
+                        SELECT id FROM t_p435659_order_management_sys.material_inventory
+                        WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                        ORDER BY created_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                ), archived AS (
+                    INSERT INTO t_p435659_order_management_sys.material_inventory_archive
+                    SELECT * FROM moved
+                    RETURNING 1
+                )
+                SELECT COUNT(*) FROM archived
+            """, (inventory_days, batch_size))
+            batch_inventory = cur.fetchone()[0]
+            conn.commit()
+            inventory_moved += batch_inventory
+            if batch_inventory < batch_size:
+                break
+
+        cur.execute("""
+            DELETE FROM t_p435659_order_management_sys.idempotency_keys
+            WHERE expires_at < CURRENT_TIMESTAMP
+        """)
+        idempotency_keys_removed = cur.rowcount
+        conn.commit()
+
+        cur.execute("""
+            DELETE FROM t_p435659_order_management_sys.change_log
+            WHERE created_at < CURRENT_TIMESTAMP - make_interval(hours => %s)
+        """, (change_log_hours,))
+        change_log_removed = cur.rowcount
+        conn.commit()
+
+        cur.execute("""
+            SELECT COUNT(*)
+            FROM t_p435659_order_management_sys.orders o
+            JOIN t_p435659_order_management_sys.orders_archive a ON a.order_number = o.order_number
+            WHERE o.status IN ('completed', 'shipped')
+              AND o.updated_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+        """, (days,))
+        order_number_conflicts = cur.fetchone()[0]
+
+        cur.close()
+        conn.close()
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'success': True,
+                'orders': orders_moved,
+                'order_items': items_moved,
+                'material_inventory': inventory_moved,
+                'idempotency_keys_removed': idempotency_keys_removed,
+                'change_log_removed': change_log_removed,
+                'order_number_conflicts': order_number_conflicts
+            }),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
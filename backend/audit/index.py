@@ -0,0 +1,111 @@
+'''
+Business: Журнал изменений: кто, когда и что изменил в заявках, позициях, материалах, пользователях и табеле
+Args: event - dict с httpMethod, queryStringParameters (entity и entity_id - история одной записи, actor_id - действия пользователя, before_id, limit)
+Returns: HTTP response с записями журнала от новых к старым и before_id для следующей страницы
+
+actor_id в журнале - пользователь из заголовка X-User-Id, который передают панели; заголовок не проверяется
+аутентификацией, поэтому журнал показывает заявленного, а не подтверждённого автора изменения.
+'''
+
+import json
+import os
+import psycopg2
+from typing import Dict, Any
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    database_url = os.environ.get('DATABASE_URL')
+
+    try:
+        conn = psycopg2.connect(database_url)
+        cur = conn.cursor()
+
+        params = event.get('queryStringParameters') or {}
+        limit = min(int(params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        before_id = int(params['before_id']) if params.get('before_id') else 2 ** 63 - 1
+
+        # Отдельный запрос на каждый фильтр, чтобы каждый шёл по своему индексу (entity, entity_id, id) или (actor_id, id)
+        if params.get('entity') and params.get('entity_id'):
+            cur.execute("""
+                SELECT a.id, a.entity, a.entity_id, a.action, a.actor_id, u.full_name, a.changes, a.created_at
+                FROM t_p435659_order_management_sys.audit_log a
+                LEFT JOIN t_p435659_order_management_sys.users u ON u.id = a.actor_id
+                WHERE a.entity = %s AND a.entity_id = %s AND a.id < %s
+                ORDER BY a.id DESC
+                LIMIT %s
+            """, (params['entity'], int(params['entity_id']), before_id, limit))
+        elif params.get('actor_id'):
+            cur.execute("""
+                SELECT a.id, a.entity, a.entity_id, a.action, a.actor_id, u.full_name, a.changes, a.created_at
+                FROM t_p435659_order_management_sys.audit_log a
+                LEFT JOIN t_p435659_order_management_sys.users u ON u.id = a.actor_id
+                WHERE a.actor_id = %s AND a.id < %s
+                ORDER BY a.id DESC
+                LIMIT %s
+            """, (int(params['actor_id']), before_id, limit))
+        else:
+            cur.execute("""
+                SELECT a.id, a.entity, a.entity_id, a.action, a.actor_id, u.full_name, a.changes, a.created_at
+                FROM t_p435659_order_management_sys.audit_log a
+                LEFT JOIN t_p435659_order_management_sys.users u ON u.id = a.actor_id
+                WHERE a.id < %s
+                ORDER BY a.id DESC
+                LIMIT %s
+            """, (before_id, limit))
+        rows = cur.fetchall()
+
+        entries = [{
+            'id': r[0],
+            'entity': r[1],
+            'entity_id': r[2],
+            'action': r[3],
+            'actor_id': r[4],
+            'actor': r[5],
+            'changes': r[6],
+            'created_at': r[7].isoformat() if r[7] else None
+        } for r in rows]
+
+        cur.close()
+        conn.close()
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'entries': entries,
+                'next_before_id': entries[-1]['id'] if len(entries) == limit else None
+            }),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
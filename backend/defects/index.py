@@ -0,0 +1,445 @@
+'''
+Business: Учёт брака (пакетный ввод, списание бракованных материалов, удаление) и показатели брака по материалам, работникам и дням
+Args: event - dict с httpMethod, body (defects - список записей брака или одна запись в теле, created_by), queryStringParameters (metrics, date_from, date_to, before_id, limit, id)
+Returns: HTTP response со списком записей брака, показателями или результатом операции
+'''
+
+import json
+import os
+import psycopg2
+from datetime import date, timedelta
+from psycopg2.extras import execute_values
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+AUDIT_SKIP_FIELDS = ('password', 'updated_at')
+
+AuditRecord = Tuple[str, Any, str, Optional[int], str]    # (entity, entity_id, action, actor_id, changes)
+
+def get_actor_id(event: Dict[str, Any]) -> Optional[int]:
+    '''Пользователь из заголовка X-User-Id. Заголовок не проверяется: это заявленный панелью, а не аутентифицированный пользователь'''
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'x-user-id' and str(value).isdigit():
+            return int(value)
+    return None
+
+def audit(records: List[AuditRecord], entity: str, entity_id: Any, action: str, actor_id: Optional[int],
+          before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    before = before or {}
+    after = after or {}
+    changes = {
+        field: [before.get(field), after.get(field)]
+        for field in set(before) | set(after)
+        if field not in AUDIT_SKIP_FIELDS and before.get(field) != after.get(field)
+    }
+    if action == 'update' and not changes:
+        return
+    records.append((entity, entity_id, action, actor_id, json.dumps(changes, default=str)))
+
+def flush_audit(cur: Any, records: List[AuditRecord]) -> None:
+    if not records:
+        return
+    execute_values(cur, """
+        INSERT INTO t_p435659_order_management_sys.audit_log (entity, entity_id, action, actor_id, changes)
+        VALUES %s
+    """, records)
+    records.clear()
+
+def invalid_defect(record: Any) -> bool:
+    '''Запись брака без количества или без материала и работника не к чему отнести в показателях'''
+    if not isinstance(record, dict):
+        return True
+    try:
+        quantity = float(record.get('quantity'))
+    except (TypeError, ValueError):
+        return True
+    return quantity <= 0 or (record.get('material_id') is None and record.get('worker_id') is None)
+
+def apply_rollups(cur: Any, rows: List[Tuple[Any, Any, Any, Any]], sign: int) -> None:
+    '''
+    Добавляет (sign = 1) или вычитает (sign = -1) записи брака из счётчиков defect_rollups одним выражением.
+    rows - (material_id, worker_id, defect_date, quantity).
+    '''
+    if not rows:
+        return
+    cur.execute("""
+        WITH d AS (
+            SELECT * FROM unnest(%s::int[], %s::int[], %s::date[], %s::numeric[])
+                AS d(material_id, worker_id, defect_date, quantity)
+        ), r AS (
+            SELECT 'material' AS dimension, material_id AS dim_id, defect_date, quantity FROM d WHERE material_id IS NOT NULL
+            UNION ALL
+            SELECT 'worker', worker_id, defect_date, quantity FROM d WHERE worker_id IS NOT NULL
+            UNION ALL
+            SELECT 'day', 0, defect_date, quantity FROM d
+        )
+        INSERT INTO t_p435659_order_management_sys.defect_rollups
+            (dimension, dim_id, defect_date, defect_count, defect_quantity)
+        SELECT dimension, dim_id, defect_date, COUNT(*) * %s, SUM(quantity) * %s
+        FROM r
+        GROUP BY dimension, defect_date, dim_id
+        ORDER BY dimension, defect_date, dim_id
+        ON CONFLICT (dimension, defect_date, dim_id) DO UPDATE
+        SET defect_count = defect_rollups.defect_count + EXCLUDED.defect_count,
+            defect_quantity = defect_rollups.defect_quantity + EXCLUDED.defect_quantity
+    """, (
+        [r[0] for r in rows],
+        [r[1] for r in rows],
+        [r[2] for r in rows],
+        [r[3] for r in rows],
+        sign,
+        sign
+    ))
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    database_url = os.environ.get('DATABASE_URL')
+    actor_id = get_actor_id(event)
+    # Записи журнала изменений этого запроса; пишутся одной вставкой перед фиксацией транзакции
+    audit_records: List[AuditRecord] = []
+
+    try:
+        conn = psycopg2.connect(database_url)
+        cur = conn.cursor()
+
+        if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+            date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else date.today()
+            date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else date_to - timedelta(days=30)
+
+            if params.get('metrics') == 'true':
+                # Показатели читаются только из счётчиков: число строк зависит от числа групп, а не записей брака
+                cur.execute("""
+                    SELECT dimension, dim_id, SUM(defect_count), SUM(defect_quantity)
+                    FROM t_p435659_order_management_sys.defect_rollups
+                    WHERE dimension IN ('material', 'worker')
+                      AND defect_date >= %s AND defect_date <= %s
+                    GROUP BY dimension, dim_id
+                    HAVING SUM(defect_count) > 0
+                """, (date_from, date_to))
+                groups = cur.fetchall()
+
+                # Выпуск по дням не записывается, поэтому брак за день нормируется на отработанные по графику часы
+                cur.execute("""
+                    SELECT r.defect_date, r.defect_count, r.defect_quantity, COALESCE(SUM(s.hours), 0)
+                    FROM t_p435659_order_management_sys.defect_rollups r
+                    LEFT JOIN t_p435659_order_management_sys.schedule s ON s.work_date = r.defect_date
+                    WHERE r.dimension = 'day'
+                      AND r.defect_date >= %s AND r.defect_date <= %s
+                      AND r.defect_count > 0
+                    GROUP BY r.defect_date, r.defect_count, r.defect_quantity
+                    ORDER BY r.defect_date
+                """, (date_from, date_to))
+                days = cur.fetchall()
+
+                material_ids = [g[1] for g in groups if g[0] == 'material']
+                worker_ids = [g[1] for g in groups if g[0] == 'worker']
+
+                cur.execute("""
+                    SELECT id, name, size, color
+                    FROM t_p435659_order_management_sys.materials
+                    WHERE id = ANY(%s)
+                """, (material_ids,))
+                materials = {m[0]: m[1:] for m in cur.fetchall()}
+
+                cur.execute("""
+                    SELECT u.id, u.full_name, COALESCE(SUM(s.hours), 0)
+                    FROM t_p435659_order_management_sys.users u
+                    LEFT JOIN t_p435659_order_management_sys.schedule s
+                        ON s.user_id = u.id AND s.work_date >= %s AND s.work_date <= %s
+                    WHERE u.id = ANY(%s)
+                    GROUP BY u.id, u.full_name
+                """, (date_from, date_to, worker_ids))
+                workers = {w[0]: (w[1], float(w[2])) for w in cur.fetchall()}
+
+                total_quantity = float(sum(d[2] for d in days)) or 1.0
+
+                by_material = []
+                by_worker = []
+                for dimension, dim_id, count, quantity in groups:
+                    if dimension == 'material':
+                        name, size, color = materials.get(dim_id, (None, None, None))
+                        by_material.append({
+                            'material_id': dim_id,
+                            'name': name,
+                            'size': size,
+                            'color': color,
+                            'defect_count': int(count),
+                            'defect_quantity': float(quantity),
+                            # Доля материала во всём браке за период, не доля брака в выпуске материала
+                            'share_of_defects': round(float(quantity) / total_quantity, 4)
+                        })
+                    else:
+                        full_name, hours = workers.get(dim_id, (None, 0.0))
+                        by_worker.append({
+                            'worker_id': dim_id,
+                            'full_name': full_name,
+                            'defect_count': int(count),
+                            'defect_quantity': float(quantity),
+                            'hours': hours,
+                            'defects_per_hour': round(float(quantity) / hours, 4) if hours else None
+                        })
+
+                by_material.sort(key=lambda m: m['defect_quantity'], reverse=True)
+                by_worker.sort(key=lambda w: w['defect_quantity'], reverse=True)
+
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({
+                        'date_from': date_from.isoformat(),
+                        'date_to': date_to.isoformat(),
+                        'by_material': by_material,
+                        'by_worker': by_worker,
+                        'by_day': [{
+                            'date': d[0].isoformat(),
+                            'defect_count': d[1],
+                            'defect_quantity': float(d[2]),
+                            'hours': float(d[3]),
+                            'defects_per_hour': round(float(d[2]) / float(d[3]), 4) if d[3] else None
+                        } for d in days]
+                    }),
+                    'isBase64Encoded': False
+                }
+
+            limit = min(int(params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            before_id = int(params['before_id']) if params.get('before_id') else 2 ** 31 - 1
+
+            cur.execute("""
+                SELECT d.id, d.order_item_id, d.material_id, m.name, d.worker_id, u.full_name,
+                       d.quantity, d.reason, d.written_off, d.defect_date, d.created_at
+                FROM t_p435659_order_management_sys.defects d
+                LEFT JOIN t_p435659_order_management_sys.materials m ON m.id = d.material_id
+                LEFT JOIN t_p435659_order_management_sys.users u ON u.id = d.worker_id
+                WHERE d.id < %s AND d.defect_date >= %s AND d.defect_date <= %s
+                ORDER BY d.id DESC
+                LIMIT %s
+            """, (before_id, date_from, date_to, limit))
+            rows = cur.fetchall()
+
+            result = [{
+                'id': r[0],
+                'order_item_id': r[1],
+                'material_id': r[2],
+                'material': r[3],
+                'worker_id': r[4],
+                'worker': r[5],
+                'quantity': float(r[6]),
+                'reason': r[7],
+                'written_off': r[8],
+                'defect_date': r[9].isoformat() if r[9] else None,
+                'created_at': r[10].isoformat() if r[10] else None
+            } for r in rows]
+
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'defects': result,
+                    'next_before_id': result[-1]['id'] if len(result) == limit else None
+                }),
+                'isBase64Encoded': False
+            }
+
+        elif method == 'POST':
+            body_data = json.loads(event.get('body', '{}'))
+            # Пакет - только явный ключ defects; без него тело считается одной записью
+            defects = body_data['defects'] if 'defects' in body_data else [body_data]
+            created_by = body_data.get('created_by')
+
+            if not isinstance(defects, list) or not defects or any(invalid_defect(d) for d in defects):
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Нужен непустой список записей брака с quantity > 0 и material_id или worker_id'}),
+                    'isBase64Encoded': False
+                }
+
+            values = [(
+                d.get('order_item_id'),
+                d.get('material_id'),
+                d.get('worker_id'),
+                d['quantity'],
+                d.get('reason', ''),
+                bool(d.get('write_off', False)),
+                d.get('defect_date') or date.today().isoformat(),
+                created_by
+            ) for d in defects]
+
+            inserted = execute_values(cur, """
+                INSERT INTO t_p435659_order_management_sys.defects
+                (order_item_id, material_id, worker_id, quantity, reason, written_off, defect_date, created_by)
+                VALUES %s
+                RETURNING id, material_id, worker_id, defect_date, quantity, written_off
+            """, values, fetch=True)
+            for defect_id, material_id, worker_id, defect_date, quantity, written_off in inserted:
+                audit(audit_records, 'defect', defect_id, 'create', actor_id, None, {
+                    'material_id': material_id,
+                    'worker_id': worker_id,
+                    'defect_date': defect_date,
+                    'quantity': float(quantity),
+                    'written_off': written_off
+                })
+
+            apply_rollups(cur, [r[1:5] for r in inserted], 1)
+
+            # Списание бракованного материала уменьшает остаток и попадает в историю остатков
+            write_offs = [(r[1], r[4]) for r in inserted if r[5] and r[1] is not None]
+            if write_offs:
+                # prev блокирует строки материалов (по id - без взаимных блокировок пакетов) и даёт прежний остаток
+                cur.execute("""
+                    WITH w AS (
+                        SELECT material_id, SUM(quantity) AS quantity
+                        FROM unnest(%s::int[], %s::numeric[]) AS w(material_id, quantity)
+                        GROUP BY material_id
+                    ), prev AS (
+                        SELECT m.id, m.quantity
+                        FROM t_p435659_order_management_sys.materials m
+                        WHERE m.id IN (SELECT material_id FROM w)
+                        ORDER BY m.id
+                        FOR UPDATE
+                    )
+                    UPDATE t_p435659_order_management_sys.materials m
+                    SET quantity = m.quantity - w.quantity, updated_at = CURRENT_TIMESTAMP
+                    FROM prev JOIN w ON w.material_id = prev.id
+                    WHERE m.id = prev.id
+                    RETURNING m.id, prev.quantity, m.quantity
+                """, ([w[0] for w in write_offs], [w[1] for w in write_offs]))
+                for material_id, before_quantity, after_quantity in cur.fetchall():
+                    audit(audit_records, 'material', material_id, 'update', actor_id,
+                          {'quantity': float(before_quantity)}, {'quantity': float(after_quantity)})
+                cur.execute("""
+                    INSERT INTO t_p435659_order_management_sys.material_inventory
+                    (material_id, quantity_change, updated_by, note)
+                    SELECT material_id, -quantity, %s, 'Списание брака'
+                    FROM unnest(%s::int[], %s::numeric[]) AS w(material_id, quantity)
+                """, (created_by, [w[0] for w in write_offs], [w[1] for w in write_offs]))
+
+            flush_audit(cur, audit_records)
+            conn.commit()
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 201,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'ids': [r[0] for r in inserted]}),
+                'isBase64Encoded': False
+            }
+
+        elif method == 'DELETE':
+            params = event.get('queryStringParameters') or {}
+            defect_id = params.get('id')
+
+            if not defect_id:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Defect ID required'}),
+                    'isBase64Encoded': False
+                }
+
+            cur.execute("""
+                DELETE FROM t_p435659_order_management_sys.defects
+                WHERE id = %s
+                RETURNING material_id, worker_id, defect_date, quantity, written_off
+            """, (defect_id,))
+            deleted = cur.fetchone()
+
+            if deleted is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Запись брака не найдена'}),
+                    'isBase64Encoded': False
+                }
+
+            material_id, worker_id, defect_date, quantity, written_off = deleted
+            audit(audit_records, 'defect', int(defect_id), 'delete', actor_id, {
+                'material_id': material_id,
+                'worker_id': worker_id,
+                'defect_date': defect_date,
+                'quantity': float(quantity),
+                'written_off': written_off
+            }, None)
+            apply_rollups(cur, [deleted[:4]], -1)
+
+            # Удаление списанного брака возвращает материал на склад с обратной записью в истории остатков
+            if written_off and material_id is not None:
+                cur.execute("""
+                    WITH prev AS (
+                        SELECT id, quantity FROM t_p435659_order_management_sys.materials
+                        WHERE id = %s
+                        FOR UPDATE
+                    )
+                    UPDATE t_p435659_order_management_sys.materials m
+                    SET quantity = m.quantity + %s, updated_at = CURRENT_TIMESTAMP
+                    FROM prev
+                    WHERE m.id = prev.id
+                    RETURNING prev.quantity, m.quantity
+                """, (material_id, quantity))
+                for before_quantity, after_quantity in cur.fetchall():
+                    audit(audit_records, 'material', material_id, 'update', actor_id,
+                          {'quantity': float(before_quantity)}, {'quantity': float(after_quantity)})
+                cur.execute("""
+                    INSERT INTO t_p435659_order_management_sys.material_inventory
+                    (material_id, quantity_change, updated_by, note)
+                    VALUES (%s, %s, %s, 'Отмена списания брака')
+                """, (material_id, quantity, actor_id))
+            flush_audit(cur, audit_records)
+            conn.commit()
+
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'success': True,
+                    'written_off': written_off,
+                    'material_id': material_id,
+                    'restored_quantity': float(quantity) if written_off and material_id is not None else 0
+                }),
+                'isBase64Encoded': False
+            }
+
+        cur.close()
+        conn.close()
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
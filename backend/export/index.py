@@ -0,0 +1,377 @@
+'''
+Business: Выгрузка заявок с позициями, истории остатков и табеля в CSV/XLSX потоком, без сборки всего результата в памяти
+Args: event - dict с httpMethod, queryStringParameters (type - orders/inventory/schedule, format - csv/xlsx, date_from, date_to, status, include_archive)
+Returns: HTTP response с файлом выгрузки; 413, как только файл превысил лимит ответа функции (для полной выгрузки - запуск из командной строки)
+
+Полная выгрузка любого объёма: DATABASE_URL=... python backend/export/index.py orders --format csv --date-from 2025-01-01 > orders.csv
+'''
+
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+import tempfile
+import zipfile
+import psycopg2
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from typing import Dict, Any, IO, Iterator, Optional, Tuple
+
+SCHEMA = 't_p435659_order_management_sys'
+FETCH_ROWS = 5000
+SPOOL_BYTES = 8 * 1024 * 1024
+MAX_RESPONSE_BYTES = 6 * 1024 * 1024
+# Предел строк на листе Excel; длинная выгрузка продолжается на следующих листах
+SHEET_ROWS = 1048576
+
+# Для каждой выгрузки: запрос по рабочим таблицам, по архивным (если есть), колонка даты, колонка статуса, сортировка
+EXPORTS: Dict[str, Dict[str, Optional[str]]] = {
+    'orders': {
+        'query': f"""
+            SELECT o.order_number, o.status, o.created_at, o.updated_at, u.full_name AS created_by,
+                   i.material, i.size, i.color, i.quantity, i.completed_quantity
+            FROM {SCHEMA}.{{orders}} o
+            JOIN {SCHEMA}.{{order_items}} i ON i.order_id = o.id
+            LEFT JOIN {SCHEMA}.users u ON u.id = o.created_by
+        """,
+        'archive': {'orders': 'orders_archive', 'order_items': 'order_items_archive'},
+        'hot': {'orders': 'orders', 'order_items': 'order_items'},
+        'date_column': 'o.created_at',
+        'status_column': 'o.status',
+        'order_by': 'created_at, order_number',
+    },
+    'inventory': {
+        'query': f"""
+            SELECT mi.created_at, m.name AS material, m.size, m.color, mi.quantity_change, mi.note,
+                   u.full_name AS updated_by
+            FROM {SCHEMA}.{{material_inventory}} mi
+            LEFT JOIN {SCHEMA}.materials m ON m.id = mi.material_id
+            LEFT JOIN {SCHEMA}.users u ON u.id = mi.updated_by
+        """,
+        'archive': {'material_inventory': 'material_inventory_archive'},
+        'hot': {'material_inventory': 'material_inventory'},
+        'date_column': 'mi.created_at',
+        'status_column': None,
+        'order_by': 'created_at',
+    },
+    'schedule': {
+        'query': f"""
+            SELECT s.work_date, u.full_name, u.login, s.hours
+            FROM {SCHEMA}.{{schedule}} s
+            JOIN {SCHEMA}.users u ON u.id = s.user_id
+        """,
+        'archive': None,
+        'hot': {'schedule': 'schedule'},
+        'date_column': 's.work_date',
+        'status_column': None,
+        'order_by': 'work_date, full_name',
+    },
+}
+
+
+def build_query(cur: Any, export_type: str, date_from: Optional[date], date_to: Optional[date],
+                status: Optional[str], include_archive: bool) -> str:
+    '''Готовый SQL с подставленными значениями: нужен COPY, который не принимает параметры'''
+    spec = EXPORTS[export_type]
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append(f"{spec['date_column']} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{spec['date_column']} < %s")
+        params.append(date_to + timedelta(days=1))
+    if status and spec['status_column']:
+        conditions.append(f"{spec['status_column']} = %s")
+        params.append(status)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    parts = [spec['query'].format(**spec['hot']) + where]
+    if include_archive and spec['archive']:
+        parts.append(spec['query'].format(**spec['archive']) + where)
+        params = params * 2
+    query = ' UNION ALL '.join(f'({part})' for part in parts) if len(parts) > 1 else parts[0]
+    query = f"SELECT * FROM ({query}) export ORDER BY {spec['order_by']}"
+    return cur.mogrify(query, params).decode()
+
+
+def tune_planner(cur: Any) -> None:
+    '''Стоимость случайного чтения для SSD вместо значения по умолчанию (4, рассчитано на HDD).
+
+    С ним выгрузка заявок за месяц идёт по idx_order_items_order_id_id, без него - Seq Scan по всем позициям:
+    ~0.22 с против ~1.35 с при --scale 4 (scripts/check_query_plans.py, export:orders)
+    '''
+    cur.execute('SET random_page_cost = 1.1')
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+class LimitedWriter:
+    '''Файл выгрузки с лимитом: бросает ResponseTooLarge, как только записано больше limit байт'''
+
+    def __init__(self, out: IO[bytes], limit: int) -> None:
+        self.out = out
+        self.limit = limit
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        if self.written > self.limit:
+            # Выгрузка уже прервана: дописывание при закрытии архива отбрасываем
+            return len(data)
+        self.written += len(data)
+        if self.written > self.limit:
+            raise ResponseTooLarge(self.written)
+        return self.out.write(data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.out, name)
+
+
+def copy_csv(conn: Any, query: str, out: IO[bytes]) -> None:
+    '''COPY TO STDOUT пишет строки в out по мере получения от сервера'''
+    cur = conn.cursor()
+    cur.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', out)
+    cur.close()
+
+
+def iter_rows(conn: Any, query: str) -> Iterator[Tuple[Any, ...]]:
+    '''Серверный (именованный) курсор: в памяти не больше FETCH_ROWS строк'''
+    cur = conn.cursor(name='export_rows')
+    cur.itersize = FETCH_ROWS
+    cur.execute(query)
+    first = cur.fetchone()
+    yield tuple(column.name for column in cur.description)
+    if first is not None:
+        yield first
+        for row in cur:
+            yield row
+    cur.close()
+
+
+XLSX_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CONTENT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+XLSX_STYLES = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="{XLSX_NS}"><numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>\
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>\
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>\
+<borders count="1"><border/></borders><cellStyleXfs count="1"><xf/></cellStyleXfs>\
+<cellXfs count="3"><xf/><xf numFmtId="14" applyNumberFormat="1"/><xf numFmtId="164" applyNumberFormat="1"/></cellXfs>\
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'''
+EXCEL_EPOCH = datetime(1899, 12, 30)
+XML_ILLEGAL = re.compile('[\\x00-\\x08\\x0b\\x0c\\x0e-\\x1f]')
+
+
+def xlsx_cell(value: Any) -> str:
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="2"><v>{serial}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="1"><v>{(value - EXCEL_EPOCH.date()).days}</v></c>'
+    text = escape(XML_ILLEGAL.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def open_sheet(archive: zipfile.ZipFile, number: int, header: str) -> IO[bytes]:
+    sheet = archive.open(f'xl/worksheets/sheet{number}.xml', 'w')
+    sheet.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<worksheet xmlns="{XLSX_NS}"><sheetData><row>{header}</row>'.encode())
+    return sheet
+
+
+def write_xlsx(conn: Any, query: str, export_type: str, out: IO[bytes]) -> None:
+    '''Листы пишутся прямо в zip-поток: сжатые байты уходят в out по мере чтения строк из БД'''
+    rows = iter_rows(conn, query)
+    header = ''.join(xlsx_cell(name) for name in next(rows))
+    sheets = [export_type]
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        sheet = open_sheet(archive, 1, header)
+        try:
+            sheet_rows = 1
+            for row in rows:
+                if sheet_rows == SHEET_ROWS:
+                    sheet.write(b'</sheetData></worksheet>')
+                    sheet.close()
+                    sheets.append(f'{export_type}_{len(sheets) + 1}')
+                    sheet = open_sheet(archive, len(sheets), header)
+                    sheet_rows = 1
+                sheet.write(f'<row>{"".join(xlsx_cell(value) for value in row)}</row>'.encode())
+                sheet_rows += 1
+            sheet.write(b'</sheetData></worksheet>')
+        finally:
+            # ZipFile не закрывается при открытом листе, а при ошибке исходное исключение важнее
+            sheet.close()
+
+        numbers = range(1, len(sheets) + 1)
+        archive.writestr('xl/styles.xml', XLSX_STYLES)
+        archive.writestr('xl/workbook.xml', (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="{XLSX_NS}" xmlns:r="{REL_NS}"><sheets>'
+            + ''.join(f'<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>' for n, name in zip(numbers, sheets))
+            + '</sheets></workbook>'))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{PKG_REL_NS}">'
+            + ''.join(f'<Relationship Id="rId{n}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                      for n in numbers)
+            + f'<Relationship Id="rId{len(sheets) + 1}" Type="{REL_NS}/styles" Target="styles.xml"/></Relationships>'))
+        archive.writestr('_rels/.rels', (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'))
+        archive.writestr('[Content_Types].xml', (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="{CONTENT_NS}">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                      for n in numbers)
+            + '</Types>'))
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    export_type = params.get('type', 'orders')
+    export_format = params.get('format', 'csv')
+
+    try:
+        date_from = parse_date(params.get('date_from'))
+        date_to = parse_date(params.get('date_to'))
+    except ValueError:
+        date_from = date_to = None
+        export_type = None
+
+    if export_type not in EXPORTS or export_format not in ('csv', 'xlsx'):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Неверные параметры выгрузки'}),
+            'isBase64Encoded': False
+        }
+
+    database_url = os.environ.get('DATABASE_URL')
+
+    try:
+        conn = psycopg2.connect(database_url)
+        cur = conn.cursor()
+        tune_planner(cur)
+        query = build_query(cur, export_type, date_from, date_to, params.get('status'),
+                            params.get('include_archive') == 'true')
+        cur.close()
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as out:
+            # XLSX уходит в base64, который увеличивает тело ответа на треть
+            limit = MAX_RESPONSE_BYTES if export_format == 'csv' else MAX_RESPONSE_BYTES * 3 // 4
+            try:
+                if export_format == 'csv':
+                    copy_csv(conn, query, LimitedWriter(out, limit))
+                else:
+                    write_xlsx(conn, query, export_type, LimitedWriter(out, limit))
+            except ResponseTooLarge:
+                # Останавливаем запрос на сервере, не дочитывая остаток выгрузки
+                conn.cancel()
+                conn.close()
+                return {
+                    'statusCode': 413,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Выгрузка слишком большая, сузьте период', 'limit': limit}),
+                    'isBase64Encoded': False
+                }
+            conn.close()
+
+            out.seek(0)
+            content = out.read()
+
+        filename = f"{export_type}_{date_from or 'all'}_{date_to or 'all'}.{export_format}"
+        if export_format == 'csv':
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'text/csv; charset=utf-8',
+                    'Content-Disposition': f'attachment; filename="{filename}"',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': content.decode('utf-8'),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': base64.b64encode(content).decode('ascii'),
+            'isBase64Encoded': True
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Потоковая выгрузка в stdout')
+    parser.add_argument('type', choices=sorted(EXPORTS))
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv')
+    parser.add_argument('--date-from', type=date.fromisoformat)
+    parser.add_argument('--date-to', type=date.fromisoformat)
+    parser.add_argument('--status')
+    parser.add_argument('--include-archive', action='store_true')
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    cursor = connection.cursor()
+    tune_planner(cursor)
+    sql = build_query(cursor, args.type, args.date_from, args.date_to, args.status, args.include_archive)
+    cursor.close()
+    if args.format == 'csv':
+        copy_csv(connection, sql, sys.stdout.buffer)
+    else:
+        write_xlsx(connection, sql, args.type, sys.stdout.buffer)
+    connection.close()
@@ -0,0 +1,223 @@
+'''
+Business: Лента изменений заявок, позиций и остатков (long-poll) на основе журнала change_log и LISTEN/NOTIFY вместо периодического опроса
+Args: event - dict с httpMethod, queryStringParameters (cursor - курсор из предыдущего ответа, timeout - ожидание в секундах)
+Returns: HTTP response с событиями после курсора и новым курсором; reset=true - клиенту нужно перечитать данные целиком
+
+Курсор - горизонт транзакций БД, поэтому продолжить ленту может любой экземпляр функции.
+Одно подключение на экземпляр: поток-слушатель читает change_log один раз на уведомление в общий буфер,
+ожидающие запросы берут события из буфера и не держат подключений к БД. При большом числе открытых панелей
+ленту лучше отдавать через scripts/feed_server.py (SSE, одно подключение к БД на все клиенты, тот же курсор).
+'''
+
+import json
+import os
+import select
+import threading
+import time
+from collections import deque
+import psycopg2
+from typing import Deque, Dict, Any, List, Optional, Tuple
+
+CHANNEL = 'order_changes'
+MAX_TIMEOUT = 25
+MAX_EVENTS = 1000
+RECHECK_SECONDS = 0.5
+IDLE_SECONDS = 30
+# Буфер событий экземпляра; курсор старше начала буфера читается из change_log напрямую
+BUFFER_EVENTS = 10000
+# Журнал чистится задачей архивации (change_log_hours); курсор старше этого срока мог потерять события
+MAX_CURSOR_AGE = 24 * 3600
+
+# Состояние слушателя под _cond: в _buffer все события с txid в [_buffer_start, _horizon), по порядку id
+_cond = threading.Condition()
+_buffer: Deque[Tuple[int, Dict[str, Any]]] = deque()
+_buffer_start = 0
+_horizon = 0
+_now = 0
+_listener: Optional[threading.Thread] = None
+_ready = threading.Event()
+
+
+def _read(cur: Any, after: int, limit: int = MAX_EVENTS) -> Tuple[int, int, List[Tuple[int, Dict[str, Any]]], bool]:
+    '''(горизонт, время БД, (txid, событие) транзакций с txid в [after, горизонт), больше ли событий, чем limit)'''
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()), EXTRACT(EPOCH FROM now())::bigint")
+    horizon, now = cur.fetchone()
+    cur.execute("""
+        SELECT txid, payload
+        FROM t_p435659_order_management_sys.change_log
+        WHERE txid >= %s AND txid < %s
+        ORDER BY id
+        LIMIT %s
+    """, (after, horizon, limit + 1))
+    rows = cur.fetchall()
+    return horizon, now, rows[:limit], len(rows) > limit
+
+
+def _advance(cur: Any) -> None:
+    '''Дочитывает change_log от горизонта буфера; при слишком большой пачке буфер начинается заново'''
+    global _buffer_start, _horizon, _now
+    horizon, now, rows, overflow = _read(cur, _horizon, BUFFER_EVENTS)
+    with _cond:
+        if overflow:
+            # Ожидающие с курсором до этой пачки получат reset
+            _buffer.clear()
+            _buffer_start = horizon
+        else:
+            _buffer.extend(rows)
+            while len(_buffer) > BUFFER_EVENTS:
+                _buffer_start = max(_buffer_start, _buffer.popleft()[0] + 1)
+        _horizon, _now = horizon, now
+        _cond.notify_all()
+
+
+def _listen(database_url: str) -> None:
+    global _buffer_start, _horizon, _now
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f'LISTEN {CHANNEL}')
+            if not _horizon:
+                cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()), EXTRACT(EPOCH FROM now())::bigint")
+                with _cond:
+                    _horizon, _now = cur.fetchone()
+                    _buffer_start = _horizon
+            # После переподключения дочитываем пропущенное: события не теряются, они в change_log
+            _advance(cur)
+            _ready.set()
+            target = 0
+            while True:
+                # Пока горизонт не прошёл уведомившие транзакции, перечитываем часто: его держит
+                # незавершённая соседняя транзакция (например, пачка архивации), и события станут видны позже
+                waiting = _horizon < target
+                if select.select([conn], [], [], RECHECK_SECONDS if waiting else IDLE_SECONDS) != ([], [], []):
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        # Уведомившая транзакция зафиксирована, значит её txid меньше xmax текущего снимка
+                        cur.execute("SELECT txid_snapshot_xmax(txid_current_snapshot())")
+                        target = max(target, cur.fetchone()[0])
+                _advance(cur)
+        except Exception:
+            _ready.clear()
+            if conn is not None:
+                conn.close()
+            time.sleep(1)
+
+
+def _ensure_listener(database_url: str) -> None:
+    global _listener
+    with _cond:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, args=(database_url,), daemon=True)
+            _listener.start()
+    _ready.wait(5)
+
+
+def _take(after: int) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+    '''События буфера для курсора (вызывать под _cond); None - курсор старше буфера, читать из change_log'''
+    if after < _buffer_start:
+        return None, False
+    events = [payload for txid, payload in _buffer if txid >= after]
+    if len(events) > MAX_EVENTS:
+        return [], True
+    return events, False
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    database_url = os.environ.get('DATABASE_URL')
+
+    try:
+        _ensure_listener(database_url)
+
+        params = event.get('queryStringParameters') or {}
+        cursor = params.get('cursor') or ''
+        timeout = min(float(params.get('timeout', MAX_TIMEOUT)), MAX_TIMEOUT)
+
+        # Курсор: "горизонт.время выдачи" (время БД, одинаковое для всех экземпляров)
+        position, _, issued = cursor.partition('.')
+        valid = position.isdigit() and issued.isdigit()
+        after = int(position) if valid else 0
+        events: Optional[List[Dict[str, Any]]] = []
+        reset = False
+        with _cond:
+            horizon, now = _horizon, _now
+        if not _ready.is_set():
+            # Слушатель ещё не подключился: разовое чтение ниже
+            events = None
+        elif not valid:
+            # Первый запрос или курсор старого формата: отдаём текущую позицию без событий
+            reset = bool(cursor)
+        elif now - int(issued) > MAX_CURSOR_AGE:
+            reset = True
+        else:
+            deadline = time.monotonic() + timeout
+            with _cond:
+                while True:
+                    events, reset = _take(after)
+                    horizon, now = max(after, _horizon), _now
+                    remaining = deadline - time.monotonic()
+                    if events or reset or events is None or remaining <= 0:
+                        break
+                    _cond.wait(remaining)
+        if events is None:
+            # Курсор старше буфера (другой экземпляр, холодный старт) или слушатель не готов: разовое чтение без ожидания
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            horizon, now, rows, reset = _read(cur, after)
+            cur.close()
+            conn.close()
+            if not valid:
+                rows, reset = [], bool(cursor)
+            elif reset or now - int(issued) > MAX_CURSOR_AGE:
+                rows, reset = [], True
+            events = [payload for _, payload in rows]
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': 'no-store'
+            },
+            'body': json.dumps({
+                'cursor': f'{horizon}.{now}',
+                'events': events,
+                'reset': reset
+            }),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -1,13 +1,145 @@
 '''
-Business: Управление материалами и остатками (создание, обновление, получение списка)
-Args: event - dict с httpMethod, body (material data)
+Business: Управление материалами и остатками (создание, обновление, получение списка, прогноз потребности по открытым заявкам)
+Args: event - dict с httpMethod, body (material data), queryStringParameters (forecast, window_days, lead_days), headers (Idempotency-Key для изменения остатка)
 Returns: HTTP response со списком материалов или результатом операции
 '''
 
+import hashlib
 import json
+import math
 import os
+import time
 import psycopg2
-from typing import Dict, Any
+from collections import OrderedDict
+from psycopg2.extras import execute_values
+from typing import Dict, Any, List, Optional, Tuple
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_CACHE_SIZE = 1000
+
+# Ответы по ключам идемпотентности, сохранённые этим экземпляром функции
+_idempotency_cache: 'OrderedDict[Tuple[str, str], Tuple[float, str, int, str]]' = OrderedDict()
+
+def get_idempotency_key(event: Dict[str, Any]) -> Optional[str]:
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'idempotency-key' and value:
+            return value[:255]
+    return None
+
+def replay_response(status_code: int, body: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Idempotent-Replayed': 'true'},
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def idempotency_conflict() -> Dict[str, Any]:
+    return {
+        'statusCode': 422,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Idempotency-Key уже использован с другим запросом'}),
+        'isBase64Encoded': False
+    }
+
+def get_request_hash(event: Dict[str, Any]) -> str:
+    return hashlib.sha256((event.get('body') or '').encode()).hexdigest()
+
+def cached_idempotent(scope: str, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    '''Ответ из кэша экземпляра: повтор обслуживается без подключения к БД'''
+    cached = _idempotency_cache.get((scope, key))
+    if not cached or cached[0] <= time.time():
+        return None
+    if cached[1] != request_hash:
+        return idempotency_conflict()
+    return replay_response(cached[2], cached[3])
+
+def begin_idempotent(cur: Any, scope: str, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    '''Занимает ключ в текущей транзакции; для уже выполненного запроса возвращает сохранённый ответ'''
+    # Параллельный запрос с тем же ключом ждёт здесь фиксации первого
+    cur.execute("""
+        INSERT INTO idempotency_keys (scope, idempotency_key, request_hash, expires_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))
+        ON CONFLICT (scope, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status_code = NULL, response_body = NULL,
+            created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+        RETURNING 1
+    """, (scope, key, request_hash, IDEMPOTENCY_TTL_HOURS))
+    if cur.fetchone():
+        return None
+    
+    cur.execute("""
+        SELECT request_hash, status_code, response_body
+        FROM idempotency_keys
+        WHERE scope = %s AND idempotency_key = %s
+    """, (scope, key))
+    stored_hash, status_code, response_body = cur.fetchone()
+    if stored_hash != request_hash:
+        return idempotency_conflict()
+    return replay_response(status_code, response_body)
+
+def finish_idempotent(cur: Any, scope: str, key: str, request_hash: str, response: Dict[str, Any]) -> None:
+    '''Сохраняет ответ в той же транзакции, что и сами изменения'''
+    cur.execute("""
+        UPDATE idempotency_keys
+        SET status_code = %s, response_body = %s
+        WHERE scope = %s AND idempotency_key = %s
+    """, (response['statusCode'], response['body'], scope, key))
+
+def remember_idempotent(scope: str, key: str, request_hash: str, response: Dict[str, Any]) -> None:
+    '''Кэширует ответ после фиксации транзакции, чтобы повтор не ходил в БД'''
+    _idempotency_cache[(scope, key)] = (
+        time.time() + IDEMPOTENCY_TTL_HOURS * 3600, request_hash, response['statusCode'], response['body']
+    )
+    _idempotency_cache.move_to_end((scope, key))
+    while len(_idempotency_cache) > IDEMPOTENCY_CACHE_SIZE:
+        _idempotency_cache.popitem(last=False)
+
+AUDIT_SKIP_FIELDS = ('password', 'updated_at')
+
+AuditRecord = Tuple[str, Any, str, Optional[int], str]    # (entity, entity_id, action, actor_id, changes)
+
+def get_actor_id(event: Dict[str, Any]) -> Optional[int]:
+    '''Пользователь из заголовка X-User-Id. Заголовок не проверяется: это заявленный панелью, а не аутентифицированный пользователь'''
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'x-user-id' and str(value).isdigit():
+            return int(value)
+    return None
+
+def audit(records: List[AuditRecord], entity: str, entity_id: Any, action: str, actor_id: Optional[int],
+          before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    before = before or {}
+    after = after or {}
+    changes = {
+        field: [before.get(field), after.get(field)]
+        for field in set(before) | set(after)
+        if field not in AUDIT_SKIP_FIELDS and before.get(field) != after.get(field)
+    }
+    if action == 'update' and not changes:
+        return
+    records.append((entity, entity_id, action, actor_id, json.dumps(changes, default=str)))
+
+def flush_audit(cur: Any, records: List[AuditRecord]) -> None:
+    if not records:
+        return
+    execute_values(cur, """
+        INSERT INTO audit_log (entity, entity_id, action, actor_id, changes)
+        VALUES %s
+    """, records)
+    records.clear()
+
+# Счётчик увеличивается до фиксации изменившей транзакции: расчёт между ними может закэшировать старые данные,
+# такой результат живёт не дольше FORECAST_CACHE_TTL
+FORECAST_CACHE_TTL = 600
+FORECAST_CACHE_SIZE = 32
+# Окно расхода и срок поставки приходят от клиента: ограничены, чтобы не плодить записи кэша
+MAX_FORECAST_DAYS = 365
+
+# Прогноз потребности: (window_days, lead_days) -> (версии таблиц, время расчёта, результат)
+_forecast_cache: 'OrderedDict[Tuple[int, int], Tuple[Tuple[int, ...], float, list]]' = OrderedDict()
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -18,7 +150,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -26,12 +158,105 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     database_url = os.environ.get('DATABASE_URL')
+    actor_id = get_actor_id(event)
+    # Записи журнала изменений этого запроса; пишутся одной вставкой перед фиксацией транзакции
+    audit_records: List[AuditRecord] = []
     
     try:
+        # Ключ идемпотентности действует только для изменения остатка (quantity_change)
+        idempotency_key = get_idempotency_key(event) if method == 'PUT' else None
+        if idempotency_key and 'quantity_change' in json.loads(event.get('body') or '{}'):
+            replay = cached_idempotent('materials:PUT', idempotency_key, get_request_hash(event))
+            if replay:
+                return replay
+        
         conn = psycopg2.connect(database_url)
         cur = conn.cursor()
         
         if method == 'GET':
+            query_params = event.get('queryStringParameters') or {}
+            
+            if query_params.get('forecast') == 'true':
+                window_days = min(max(int(query_params.get('window_days', 30)), 1), MAX_FORECAST_DAYS)
+                lead_days = min(max(int(query_params.get('lead_days', 14)), 0), MAX_FORECAST_DAYS)
+                
+                # Кэш действителен, пока не менялись заявки, позиции, материалы и история остатков (счётчики из V0017).
+                # Первый nextval новой последовательности не меняет last_value, только is_called: учитываем оба
+                cur.execute("""
+                    SELECT (SELECT last_value + is_called::int FROM orders_data_version),
+                           (SELECT last_value + is_called::int FROM order_items_data_version),
+                           (SELECT last_value + is_called::int FROM materials_data_version),
+                           (SELECT last_value + is_called::int FROM material_inventory_data_version)
+                """)
+                versions = tuple(cur.fetchone())
+                cached = _forecast_cache.get((window_days, lead_days))
+                
+                if cached and cached[0] == versions and time.time() - cached[1] < FORECAST_CACHE_TTL:
+                    result = cached[2]
+                    _forecast_cache.move_to_end((window_days, lead_days))
+                else:
+                    cur.execute("""
+                        WITH demand AS (
+                            SELECT oi.material, COALESCE(oi.size, '') AS size, COALESCE(oi.color, '') AS color,
+                                   SUM(oi.quantity - COALESCE(oi.completed_quantity, 0)) AS required
+                            FROM order_items oi
+                            JOIN orders o ON o.id = oi.order_id
+                            WHERE o.status IN ('created', 'in_progress')
+                              AND oi.quantity > COALESCE(oi.completed_quantity, 0)
+                            GROUP BY 1, 2, 3
+                        ), stock AS (
+                            SELECT name AS material, COALESCE(size, '') AS size, COALESCE(color, '') AS color,
+                                   SUM(quantity) AS quantity
+                            FROM materials
+                            GROUP BY 1, 2, 3
+                        ), consumption AS (
+                            SELECT m.name AS material, COALESCE(m.size, '') AS size, COALESCE(m.color, '') AS color,
+                                   -SUM(mi.quantity_change) AS consumed
+                            FROM material_inventory mi
+                            JOIN materials m ON m.id = mi.material_id
+                            WHERE mi.created_at >= CURRENT_TIMESTAMP - make_interval(days => %s)
+                              AND mi.quantity_change < 0
+                            GROUP BY 1, 2, 3
+                        )
+                        SELECT d.material, d.size, d.color, d.required, COALESCE(s.quantity, 0), COALESCE(c.consumed, 0)
+                        FROM demand d
+                        LEFT JOIN stock s USING (material, size, color)
+                        LEFT JOIN consumption c USING (material, size, color)
+                        ORDER BY d.required - COALESCE(s.quantity, 0) DESC, d.material, d.size, d.color
+                    """, (window_days,))
+                    
+                    result = []
+                    for f in cur.fetchall():
+                        required = float(f[3])
+                        stock = float(f[4])
+                        daily_consumption = float(f[5]) / window_days if window_days > 0 else 0
+                        result.append({
+                            'material': f[0],
+                            'size': f[1],
+                            'color': f[2],
+                            'required': required,
+                            'stock': stock,
+                            'shortfall': max(0.0, required - stock),
+                            'daily_consumption': round(daily_consumption, 2),
+                            'suggested_reorder': max(0, math.ceil(required + daily_consumption * lead_days - stock))
+                        })
+                    _forecast_cache[(window_days, lead_days)] = (versions, time.time(), result)
+                    _forecast_cache.move_to_end((window_days, lead_days))
+                    while len(_forecast_cache) > FORECAST_CACHE_SIZE:
+                        _forecast_cache.popitem(last=False)
+                
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(result),
+                    'isBase64Encoded': False
+                }
+            
             cur.execute(
                 "SELECT id, name, size, color, quantity, material_type, image_url, section_id, created_at FROM materials ORDER BY created_at DESC"
             )
@@ -76,6 +301,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 (name, size, color, quantity, material_type, image_url, section_id)
             )
             material_id = cur.fetchone()[0]
+            audit(audit_records, 'material', material_id, 'create', actor_id, None, {
+                'name': name,
+                'size': size,
+                'color': color,
+                'quantity': quantity,
+                'material_type': material_type,
+                'image_url': image_url,
+                'section_id': section_id
+            })
+            flush_audit(cur, audit_records)
             conn.commit()
             
             cur.close()
@@ -94,14 +329,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body_data = json.loads(event.get('body', '{}'))
             material_id = body_data.get('id')
             
+            idempotency_key = None
+            
             if 'quantity_change' in body_data:
                 quantity_change = body_data.get('quantity_change', 0)
                 updated_by = body_data.get('updated_by')
+                # Повтор списания/поступления по тому же ключу не должен изменить остаток второй раз
+                idempotency_key = get_idempotency_key(event)
+                request_hash = get_request_hash(event)
                 
+                if idempotency_key:
+                    replay = begin_idempotent(cur, 'materials:PUT', idempotency_key, request_hash)
+                    if replay:
+                        conn.rollback()
+                        cur.close()
+                        conn.close()
+                        return replay
+                
+                # prev берёт блокировку строки: при параллельном изменении ждёт его и читает зафиксированный остаток
                 cur.execute(
-                    "UPDATE materials SET quantity = quantity + %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-                    (quantity_change, material_id)
+                    "WITH prev AS (SELECT id, quantity FROM materials WHERE id = %s FOR UPDATE) UPDATE materials m SET quantity = m.quantity + %s, updated_at = CURRENT_TIMESTAMP FROM prev WHERE m.id = prev.id RETURNING prev.quantity, m.quantity",
+                    (material_id, quantity_change)
                 )
+                for before_quantity, after_quantity in cur.fetchall():
+                    audit(audit_records, 'material', material_id, 'update', actor_id,
+                          {'quantity': float(before_quantity)}, {'quantity': float(after_quantity)})
                 
                 cur.execute(
                     "INSERT INTO material_inventory (material_id, quantity_change, updated_by) VALUES (%s, %s, %s)",
@@ -117,14 +369,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 section_id = body_data.get('section_id')
                 
                 cur.execute(
-                    "UPDATE materials SET name = %s, size = %s, color = %s, quantity = %s, material_type = %s, image_url = %s, section_id = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-                    (name, size, color, quantity, material_type, image_url, section_id, material_id)
+                    "WITH prev AS (SELECT * FROM materials WHERE id = %s FOR UPDATE) UPDATE materials m SET name = %s, size = %s, color = %s, quantity = %s, material_type = %s, image_url = %s, section_id = %s, updated_at = CURRENT_TIMESTAMP FROM prev WHERE m.id = prev.id RETURNING row_to_json(prev), row_to_json(m)",
+                    (material_id, name, size, color, quantity, material_type, image_url, section_id)
                 )
+                for before, after in cur.fetchall():
+                    audit(audit_records, 'material', material_id, 'update', actor_id, before, after)
             
-            conn.commit()
-            cur.close()
-            conn.close()
-            return {
+            response = {
                 'statusCode': 200,
                 'headers': {
                     'Content-Type': 'application/json',
@@ -133,6 +384,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'success': True}),
                 'isBase64Encoded': False
             }
+            
+            if idempotency_key:
+                finish_idempotent(cur, 'materials:PUT', idempotency_key, request_hash, response)
+            
+            flush_audit(cur, audit_records)
+            conn.commit()
+            
+            if idempotency_key:
+                remember_idempotent('materials:PUT', idempotency_key, request_hash, response)
+            
+            cur.close()
+            conn.close()
+            return response
         
         elif method == 'DELETE':
             query_params = event.get('queryStringParameters') or {}
@@ -146,7 +410,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute("DELETE FROM materials WHERE id = %s", (material_id,))
+            cur.execute("DELETE FROM materials m WHERE m.id = %s RETURNING row_to_json(m)", (material_id,))
+            for deleted in cur.fetchall():
+                audit(audit_records, 'material', int(material_id), 'delete', actor_id, deleted[0], None)
+            flush_audit(cur, audit_records)
             conn.commit()
             
             cur.close()
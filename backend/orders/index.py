@@ -1,13 +1,134 @@
 '''
 Business: Управление заявками на производство (создание, обновление статуса, получение списка, добавление позиций)
-Args: event - dict с httpMethod, body (order data), queryStringParameters (status filter, id)
+Args: event - dict с httpMethod, body (order data), queryStringParameters (status filter, id, archive), headers (Idempotency-Key для POST)
 Returns: HTTP response с данными заявок или результатом операции
 '''
 
+import hashlib
 import json
 import os
+import time
 import psycopg2
-from typing import Dict, Any
+from collections import OrderedDict
+from psycopg2.extras import execute_values
+from typing import Dict, Any, List, Optional, Tuple
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_CACHE_SIZE = 1000
+
+# Ответы по ключам идемпотентности, сохранённые этим экземпляром функции
+_idempotency_cache: 'OrderedDict[Tuple[str, str], Tuple[float, str, int, str]]' = OrderedDict()
+
+def get_idempotency_key(event: Dict[str, Any]) -> Optional[str]:
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'idempotency-key' and value:
+            return value[:255]
+    return None
+
+def replay_response(status_code: int, body: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Idempotent-Replayed': 'true'},
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def idempotency_conflict() -> Dict[str, Any]:
+    return {
+        'statusCode': 422,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Idempotency-Key уже использован с другим запросом'}),
+        'isBase64Encoded': False
+    }
+
+def get_request_hash(event: Dict[str, Any]) -> str:
+    return hashlib.sha256((event.get('body') or '').encode()).hexdigest()
+
+def cached_idempotent(scope: str, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    '''Ответ из кэша экземпляра: повтор обслуживается без подключения к БД'''
+    cached = _idempotency_cache.get((scope, key))
+    if not cached or cached[0] <= time.time():
+        return None
+    if cached[1] != request_hash:
+        return idempotency_conflict()
+    return replay_response(cached[2], cached[3])
+
+def begin_idempotent(cur: Any, scope: str, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    '''Занимает ключ в текущей транзакции; для уже выполненного запроса возвращает сохранённый ответ'''
+    # Параллельный запрос с тем же ключом ждёт здесь фиксации первого
+    cur.execute("""
+        INSERT INTO t_p435659_order_management_sys.idempotency_keys (scope, idempotency_key, request_hash, expires_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))
+        ON CONFLICT (scope, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status_code = NULL, response_body = NULL,
+            created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+        RETURNING 1
+    """, (scope, key, request_hash, IDEMPOTENCY_TTL_HOURS))
+    if cur.fetchone():
+        return None
+    
+    cur.execute("""
+        SELECT request_hash, status_code, response_body
+        FROM t_p435659_order_management_sys.idempotency_keys
+        WHERE scope = %s AND idempotency_key = %s
+    """, (scope, key))
+    stored_hash, status_code, response_body = cur.fetchone()
+    if stored_hash != request_hash:
+        return idempotency_conflict()
+    return replay_response(status_code, response_body)
+
+def finish_idempotent(cur: Any, scope: str, key: str, request_hash: str, response: Dict[str, Any]) -> None:
+    '''Сохраняет ответ в той же транзакции, что и сами изменения'''
+    cur.execute("""
+        UPDATE t_p435659_order_management_sys.idempotency_keys
+        SET status_code = %s, response_body = %s
+        WHERE scope = %s AND idempotency_key = %s
+    """, (response['statusCode'], response['body'], scope, key))
+
+def remember_idempotent(scope: str, key: str, request_hash: str, response: Dict[str, Any]) -> None:
+    '''Кэширует ответ после фиксации транзакции, чтобы повтор не ходил в БД'''
+    _idempotency_cache[(scope, key)] = (
+        time.time() + IDEMPOTENCY_TTL_HOURS * 3600, request_hash, response['statusCode'], response['body']
+    )
+    _idempotency_cache.move_to_end((scope, key))
+    while len(_idempotency_cache) > IDEMPOTENCY_CACHE_SIZE:
+        _idempotency_cache.popitem(last=False)
+
+AUDIT_SKIP_FIELDS = ('password', 'updated_at')
+
+AuditRecord = Tuple[str, Any, str, Optional[int], str]    # (entity, entity_id, action, actor_id, changes)
+
+def get_actor_id(event: Dict[str, Any]) -> Optional[int]:
+    '''Пользователь из заголовка X-User-Id. Заголовок не проверяется: это заявленный панелью, а не аутентифицированный пользователь'''
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'x-user-id' and str(value).isdigit():
+            return int(value)
+    return None
+
+def audit(records: List[AuditRecord], entity: str, entity_id: Any, action: str, actor_id: Optional[int],
+          before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    before = before or {}
+    after = after or {}
+    changes = {
+        field: [before.get(field), after.get(field)]
+        for field in set(before) | set(after)
+        if field not in AUDIT_SKIP_FIELDS and before.get(field) != after.get(field)
+    }
+    if action == 'update' and not changes:
+        return
+    records.append((entity, entity_id, action, actor_id, json.dumps(changes, default=str)))
+
+def flush_audit(cur: Any, records: List[AuditRecord]) -> None:
+    if not records:
+        return
+    execute_values(cur, """
+        INSERT INTO t_p435659_order_management_sys.audit_log (entity, entity_id, action, actor_id, changes)
+        VALUES %s
+    """, records)
+    records.clear()
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -18,7 +139,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -26,6 +147,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     database_url = os.environ.get('DATABASE_URL')
+    actor_id = get_actor_id(event)
+    # Записи журнала изменений этого запроса; пишутся одной вставкой перед фиксацией транзакции
+    audit_records: List[AuditRecord] = []
+    
+    idempotency_key = get_idempotency_key(event) if method == 'POST' else None
+    if idempotency_key:
+        replay = cached_idempotent('orders:POST', idempotency_key, get_request_hash(event))
+        if replay:
+            return replay
     
     try:
         conn = psycopg2.connect(database_url)
@@ -35,64 +165,43 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             params = event.get('queryStringParameters') or {}
             status_filter = params.get('status')
             order_id = params.get('id')
+            # Выполненные заявки старше срока хранения лежат в архиве и читаются только по запросу
+            archive = params.get('archive') == 'true'
             
             if order_id:
+                if archive:
+                    cur.execute("""
+                        SELECT o.id, o.order_number, o.status, o.created_by, o.created_at, o.updated_at
+                        FROM t_p435659_order_management_sys.orders_archive o
+                        WHERE o.id = %s
+                    """, (order_id,))
+                else:
+                    cur.execute("""
+                        SELECT o.id, o.order_number, o.status, o.created_by, o.created_at, o.updated_at
+                        FROM t_p435659_order_management_sys.orders o
+                        WHERE o.id = %s
+                    """, (order_id,))
+            elif status_filter:
+                if archive:
+                    cur.execute("""
+                        SELECT o.id, o.order_number, o.status, o.created_by, o.created_at, o.updated_at
+                        FROM t_p435659_order_management_sys.orders_archive o
+                        WHERE o.status = %s
+                        ORDER BY o.created_at DESC
+                    """, (status_filter,))
+                else:
+                    cur.execute("""
+                        SELECT o.id, o.order_number, o.status, o.created_by, o.created_at, o.updated_at
+                        FROM t_p435659_order_management_sys.orders o
+                        WHERE o.status = %s
+                        ORDER BY o.created_at DESC
+                    """, (status_filter,))
+            elif archive:
                 cur.execute("""
                     SELECT o.id, o.order_number, o.status, o.created_by, o.created_at, o.updated_at
-                    FROM t_p435659_order_management_sys.orders o
-                    WHERE o.id = %s
-                """, (order_id,))
-                order_row = cur.fetchone()
-                
-                if not order_row:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Order not found'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cur.execute("""
-                    SELECT id, material, quantity, size, color, completed_quantity
-                    FROM t_p435659_order_management_sys.order_items
-                    WHERE order_id = %s
-                    ORDER BY id
-                """, (order_id,))
-                items = cur.fetchall()
-                
-                result = {
-                    'id': order_row[0],
-                    'order_number': order_row[1],
-                    'status': order_row[2],
-                    'created_by': order_row[3],
-                    'created_at': order_row[4].isoformat() if order_row[4] else None,
-                    'updated_at': order_row[5].isoformat() if order_row[5] else None,
-                    'items': [{
-                        'id': i[0],
-                        'material': i[1],
-                        'quantity': i[2],
-                        'size': i[3],
-                        'color': i[4],
-                        'completed_quantity': i[5]
-                    } for i in items]
-                }
-                
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(result),
-                    'isBase64Encoded': False
-                }
-            
-            if status_filter:
-                cur.execute("""
-                    SELECT o.id, o.order_number, o.status, o.created_by, o.created_at, o.updated_at
-                    FROM t_p435659_order_management_sys.orders o
-                    WHERE o.status = %s
+                    FROM t_p435659_order_management_sys.orders_archive o
                     ORDER BY o.created_at DESC
-                """, (status_filter,))
+                """)
             else:
                 cur.execute("""
                     SELECT o.id, o.order_number, o.status, o.created_by, o.created_at, o.updated_at
@@ -101,45 +210,75 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 """)
             
             orders_rows = cur.fetchall()
-            result = []
             
-            for o in orders_rows:
-                cur.execute("""
-                    SELECT id, material, quantity, size, color, completed_quantity
-                    FROM t_p435659_order_management_sys.order_items
-                    WHERE order_id = %s
-                    ORDER BY id
-                """, (o[0],))
-                items = cur.fetchall()
+            if order_id and not orders_rows:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Order not found'}),
+                    'isBase64Encoded': False
+                }
+            
+            items_by_order: Dict[int, list] = {o[0]: [] for o in orders_rows}
+            
+            if orders_rows:
+                if archive:
+                    cur.execute("""
+                        SELECT order_id, id, material, quantity, size, color, completed_quantity
+                        FROM t_p435659_order_management_sys.order_items_archive
+                        WHERE order_id = ANY(%s)
+                        ORDER BY order_id, id
+                    """, (list(items_by_order),))
+                else:
+                    cur.execute("""
+                        SELECT order_id, id, material, quantity, size, color, completed_quantity
+                        FROM t_p435659_order_management_sys.order_items
+                        WHERE order_id = ANY(%s)
+                        ORDER BY order_id, id
+                    """, (list(items_by_order),))
                 
-                result.append({
-                    'id': o[0],
-                    'order_number': o[1],
-                    'status': o[2],
-                    'created_by': o[3],
-                    'created_at': o[4].isoformat() if o[4] else None,
-                    'updated_at': o[5].isoformat() if o[5] else None,
-                    'items': [{
-                        'id': i[0],
-                        'material': i[1],
-                        'quantity': i[2],
-                        'size': i[3],
-                        'color': i[4],
-                        'completed_quantity': i[5]
-                    } for i in items]
-                })
+                for i in cur.fetchall():
+                    items_by_order[i[0]].append({
+                        'id': i[1],
+                        'material': i[2],
+                        'quantity': i[3],
+                        'size': i[4],
+                        'color': i[5],
+                        'completed_quantity': i[6]
+                    })
+            
+            result = [{
+                'id': o[0],
+                'order_number': o[1],
+                'status': o[2],
+                'created_by': o[3],
+                'created_at': o[4].isoformat() if o[4] else None,
+                'updated_at': o[5].isoformat() if o[5] else None,
+                'items': items_by_order[o[0]]
+            } for o in orders_rows]
             
             cur.close()
             conn.close()
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(result),
+                'body': json.dumps(result[0] if order_id else result),
                 'isBase64Encoded': False
             }
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
+            request_hash = get_request_hash(event)
+            
+            if idempotency_key:
+                replay = begin_idempotent(cur, 'orders:POST', idempotency_key, request_hash)
+                if replay:
+                    conn.rollback()
+                    cur.close()
+                    conn.close()
+                    return replay
             
             if 'order_id' in body_data and 'item' in body_data:
                 order_id = body_data['order_id']
@@ -160,52 +299,94 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 ))
                 
                 item_id = cur.fetchone()[0]
-                conn.commit()
-                
-                cur.close()
-                conn.close()
-                return {
+                audit(audit_records, 'order_item', item_id, 'create', actor_id, None, {
+                    'order_id': order_id,
+                    'material': item.get('material'),
+                    'quantity': item.get('quantity', 0),
+                    'size': item.get('size', ''),
+                    'color': item.get('color', '')
+                })
+                response = {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({'success': True, 'item_id': item_id}),
                     'isBase64Encoded': False
                 }
+            else:
+                order_number = body_data.get('order_number')
+                items = body_data.get('items', [])
+                created_by = body_data.get('created_by')
+                
+                # Номер уникален среди рабочих и архивных заявок: архив переносит заявку вместе с номером
+                cur.execute("""
+                    INSERT INTO t_p435659_order_management_sys.orders (order_number, created_by)
+                    SELECT %s, %s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM t_p435659_order_management_sys.orders_archive
+                        WHERE order_number = %s
+                    )
+                    ON CONFLICT (order_number) DO NOTHING
+                    RETURNING id
+                """, (order_number, created_by, order_number))
+                
+                created = cur.fetchone()
+                if created is None:
+                    conn.rollback()
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 409,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Заявка с номером {order_number} уже существует'}),
+                        'isBase64Encoded': False
+                    }
+                order_id = created[0]
+                audit(audit_records, 'order', order_id, 'create', actor_id, None, {
+                    'order_number': order_number,
+                    'created_by': created_by
+                })
+                
+                for item in items:
+                    cur.execute("""
+                        INSERT INTO t_p435659_order_management_sys.order_items 
+                        (order_id, material, quantity, size, color, completed_quantity)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        RETURNING id
+                    """, (
+                        order_id,
+                        item.get('material'),
+                        item.get('quantity', 0),
+                        item.get('size', ''),
+                        item.get('color', ''),
+                        0
+                    ))
+                    audit(audit_records, 'order_item', cur.fetchone()[0], 'create', actor_id, None, {
+                        'order_id': order_id,
+                        'material': item.get('material'),
+                        'quantity': item.get('quantity', 0),
+                        'size': item.get('size', ''),
+                        'color': item.get('color', '')
+                    })
+                
+                response = {
+                    'statusCode': 201,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, 'id': order_id}),
+                    'isBase64Encoded': False
+                }
             
-            order_number = body_data.get('order_number')
-            items = body_data.get('items', [])
-            created_by = body_data.get('created_by')
-            
-            cur.execute("""
-                INSERT INTO t_p435659_order_management_sys.orders (order_number, created_by)
-                VALUES (%s, %s)
-                RETURNING id
-            """, (order_number, created_by))
+            if idempotency_key:
+                finish_idempotent(cur, 'orders:POST', idempotency_key, request_hash, response)
             
-            order_id = cur.fetchone()[0]
+            flush_audit(cur, audit_records)
+            conn.commit()
             
-            for item in items:
-                cur.execute("""
-                    INSERT INTO t_p435659_order_management_sys.order_items 
-                    (order_id, material, quantity, size, color, completed_quantity)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    order_id,
-                    item.get('material'),
-                    item.get('quantity', 0),
-                    item.get('size', ''),
-                    item.get('color', ''),
-                    0
-                ))
+            if idempotency_key:
+                remember_idempotent('orders:POST', idempotency_key, request_hash, response)
             
-            conn.commit()
             cur.close()
             conn.close()
-            return {
-                'statusCode': 201,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'id': order_id}),
-                'isBase64Encoded': False
-            }
+            return response
         
         elif method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
@@ -214,14 +395,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 item_id = body_data['item_id']
                 completed = body_data.get('completed_quantity', 0)
                 
+                # prev берёт блокировку строки: при параллельном изменении ждёт его и читает зафиксированное значение
                 cur.execute("""
-                    UPDATE t_p435659_order_management_sys.order_items
+                    WITH prev AS (
+                        SELECT id, completed_quantity FROM t_p435659_order_management_sys.order_items
+                        WHERE id = %s
+                        FOR UPDATE
+                    )
+                    UPDATE t_p435659_order_management_sys.order_items oi
                     SET completed_quantity = %s
-                    WHERE id = %s
-                    RETURNING order_id
-                """, (completed, item_id))
+                    FROM prev
+                    WHERE oi.id = prev.id
+                    RETURNING oi.order_id, prev.completed_quantity
+                """, (item_id, completed))
                 
-                order_id = cur.fetchone()[0]
+                order_id, previous_completed = cur.fetchone()
+                audit(audit_records, 'order_item', item_id, 'update', actor_id,
+                      {'completed_quantity': previous_completed}, {'completed_quantity': completed})
                 
                 cur.execute("""
                     SELECT 
@@ -243,11 +433,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     new_status = 'created'
                 
                 cur.execute("""
-                    UPDATE t_p435659_order_management_sys.orders
+                    WITH prev AS (
+                        SELECT id, status FROM t_p435659_order_management_sys.orders
+                        WHERE id = %s
+                        FOR UPDATE
+                    )
+                    UPDATE t_p435659_order_management_sys.orders o
                     SET status = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (new_status, order_id))
+                    FROM prev
+                    WHERE o.id = prev.id
+                    RETURNING prev.status
+                """, (order_id, new_status))
+                audit(audit_records, 'order', order_id, 'update', actor_id,
+                      {'status': cur.fetchone()[0]}, {'status': new_status})
                 
+                flush_audit(cur, audit_records)
                 conn.commit()
                 cur.close()
                 conn.close()
@@ -263,10 +463,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if 'status' in body_data:
                 status = body_data['status']
                 cur.execute("""
-                    UPDATE t_p435659_order_management_sys.orders
+                    WITH prev AS (
+                        SELECT id, status FROM t_p435659_order_management_sys.orders
+                        WHERE id = %s
+                        FOR UPDATE
+                    )
+                    UPDATE t_p435659_order_management_sys.orders o
                     SET status = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (status, order_id))
+                    FROM prev
+                    WHERE o.id = prev.id
+                    RETURNING prev.status
+                """, (order_id, status))
+                previous = cur.fetchone()
+                if previous:
+                    audit(audit_records, 'order', order_id, 'update', actor_id, {'status': previous[0]}, {'status': status})
+                flush_audit(cur, audit_records)
                 conn.commit()
             
             cur.close()
@@ -290,8 +501,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute("DELETE FROM t_p435659_order_management_sys.order_items WHERE order_id = %s", (order_id,))
-            cur.execute("DELETE FROM t_p435659_order_management_sys.orders WHERE id = %s", (order_id,))
+            # Позиции удалились бы каскадом мимо журнала: удаляем их явно, до заявки (тот же порядок блокировок, что у PUT)
+            cur.execute(
+                "DELETE FROM t_p435659_order_management_sys.order_items i WHERE i.order_id = %s RETURNING i.id, row_to_json(i)",
+                (order_id,)
+            )
+            for item_id, deleted in cur.fetchall():
+                audit(audit_records, 'order_item', item_id, 'delete', actor_id, deleted, None)
+            cur.execute(
+                "DELETE FROM t_p435659_order_management_sys.orders o WHERE o.id = %s RETURNING row_to_json(o)",
+                (order_id,)
+            )
+            for deleted in cur.fetchall():
+                audit(audit_records, 'order', int(order_id), 'delete', actor_id, deleted[0], None)
+            flush_audit(cur, audit_records)
             conn.commit()
             
             cur.close()
@@ -0,0 +1,243 @@
+'''
+Business: Планирование производства: распределение открытых позиций заявок по работникам по часам из графика и прогноз даты готовности заявок
+Args: event - dict с httpMethod, queryStringParameters (date_from, days - горизонт планирования, details - разбивка по работникам), body (material, units_per_hour для PUT)
+Returns: HTTP response с прогнозом готовности по заявкам или результатом обновления выработки
+'''
+
+import json
+import os
+import threading
+import psycopg2
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_UNITS_PER_HOUR = 10.0
+DEFAULT_HORIZON_DAYS = 31
+EPS = 1e-9
+
+Item = Tuple[int, int, str, float]    # (item_id, order_id, material, часы работы)
+Slot = Tuple[date, int, float]        # (work_date, user_id, часы)
+
+
+class Planner:
+    '''
+    Жадное планирование в порядке очереди: каждая позиция занимает самые ранние свободные часы.
+    Перед каждой позицией сохраняется состояние (индекс слота, занятые в нём часы), поэтому при изменении
+    одной позиции или одного табеля план пересчитывается только с первой затронутой позиции.
+    '''
+
+    def __init__(self) -> None:
+        self.items: List[Item] = []
+        self.slots: List[Slot] = []
+        self.checkpoints: List[Tuple[int, float]] = [(0, 0.0)]
+        self.assignments: List[List[Tuple[int, float]]] = []
+
+    def sync(self, items: List[Item], slots: List[Slot]) -> int:
+        '''Обновляет входные данные и пересчитывает план; возвращает индекс позиции, с которой шёл пересчёт'''
+        first_item = self._first_difference(self.items, items)
+        first_slot = self._first_difference(self.slots, slots)
+        start = first_item
+        if first_slot is not None:
+            # Первая позиция, дошедшая до изменённого слота; состояния до неё ссылаются только на слоты раньше него
+            end_slots = [checkpoint[0] for checkpoint in self.checkpoints[1:]]
+            affected = bisect_left(end_slots, first_slot)
+            start = affected if start is None else min(start, affected)
+        self.items = items
+        self.slots = slots
+        if start is None:
+            return len(items)
+        self._plan_from(start)
+        return start
+
+    @staticmethod
+    def _first_difference(old: List[Any], new: List[Any]) -> Optional[int]:
+        for index, (a, b) in enumerate(zip(old, new)):
+            if a != b:
+                return index
+        if len(old) != len(new):
+            return min(len(old), len(new))
+        return None
+
+    def _plan_from(self, start: int) -> None:
+        start = min(start, len(self.checkpoints) - 1)
+        del self.checkpoints[start + 1:]
+        del self.assignments[start:]
+        slot, used = self.checkpoints[start]
+        slots = self.slots
+        for _, _, _, need in self.items[start:]:
+            parts = []
+            while need > EPS and slot < len(slots):
+                take = min(need, slots[slot][2] - used)
+                parts.append((slot, take))
+                need -= take
+                used += take
+                if slots[slot][2] - used <= EPS:
+                    slot += 1
+                    used = 0.0
+            self.assignments.append(parts if need <= EPS else parts + [(-1, need)])
+            self.checkpoints.append((slot, used))
+
+    def completion(self, index: int) -> Optional[date]:
+        parts = self.assignments[index]
+        if not parts or parts[-1][0] < 0:
+            return None
+        return self.slots[parts[-1][0]][0]
+
+
+_planner = Planner()
+# Экземпляр может обслуживать несколько вызовов одновременно: sync и чтение плана идут под одной блокировкой
+_planner_lock = threading.Lock()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, PUT, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    database_url = os.environ.get('DATABASE_URL')
+
+    try:
+        conn = psycopg2.connect(database_url)
+        cur = conn.cursor()
+
+        if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+            date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else date.today()
+            days = int(params.get('days', DEFAULT_HORIZON_DAYS))
+            details = params.get('details') == 'true'
+
+            cur.execute("""
+                SELECT material, units_per_hour
+                FROM t_p435659_order_management_sys.production_rates
+            """)
+            rates = {r[0]: float(r[1]) for r in cur.fetchall()}
+
+            cur.execute("""
+                SELECT oi.id, oi.order_id, o.order_number, oi.material, oi.quantity - COALESCE(oi.completed_quantity, 0)
+                FROM t_p435659_order_management_sys.orders o
+                JOIN t_p435659_order_management_sys.order_items oi ON oi.order_id = o.id
+                WHERE o.status IN ('created', 'in_progress')
+                  AND oi.quantity > COALESCE(oi.completed_quantity, 0)
+                ORDER BY o.created_at, o.id, oi.id
+            """)
+            item_rows = cur.fetchall()
+
+            cur.execute("""
+                SELECT work_date, user_id, hours
+                FROM t_p435659_order_management_sys.schedule
+                WHERE work_date >= %s AND work_date < %s AND hours > 0
+                ORDER BY work_date, user_id
+            """, (date_from, date_from + timedelta(days=days)))
+            slots = [(r[0], r[1], float(r[2])) for r in cur.fetchall()]
+
+            cur.close()
+            conn.close()
+
+            items = [(r[0], r[1], r[3], r[4] / rates.get(r[3], DEFAULT_UNITS_PER_HOUR)) for r in item_rows]
+            with _planner_lock:
+                replanned_from = _planner.sync(items, slots)
+
+                orders: Dict[int, Dict[str, Any]] = {}
+                for index, r in enumerate(item_rows):
+                    order = orders.get(r[1])
+                    if order is None:
+                        order = orders[r[1]] = {
+                            'order_id': r[1],
+                            'order_number': r[2],
+                            'projected_completion': None,
+                            'planned': True,
+                            'items': []
+                        }
+                    finish = _planner.completion(index)
+                    if finish is None:
+                        order['planned'] = False
+                    elif order['planned'] and (order['projected_completion'] is None or finish > order['projected_completion']):
+                        order['projected_completion'] = finish
+                    if details:
+                        order['items'].append({
+                            'item_id': r[0],
+                            'material': r[3],
+                            'remaining_quantity': r[4],
+                            'hours': round(items[index][3], 2),
+                            'projected_completion': finish.isoformat() if finish else None,
+                            'assignments': [{
+                                'work_date': _planner.slots[slot][0].isoformat(),
+                                'user_id': _planner.slots[slot][1],
+                                'hours': round(hours, 2)
+                            } for slot, hours in _planner.assignments[index] if slot >= 0]
+                        })
+
+            result = []
+            for order in orders.values():
+                if not order['planned']:
+                    order['projected_completion'] = None
+                elif order['projected_completion']:
+                    order['projected_completion'] = order['projected_completion'].isoformat()
+                if not details:
+                    del order['items']
+                result.append(order)
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'date_from': date_from.isoformat(),
+                    'days': days,
+                    'open_items': len(items),
+                    'unplanned_orders': sum(1 for o in result if not o['planned']),
+                    'replanned_from': replanned_from,
+                    'orders': result
+                }),
+                'isBase64Encoded': False
+            }
+
+        elif method == 'PUT':
+            body_data = json.loads(event.get('body', '{}'))
+            material = body_data.get('material')
+            units_per_hour = body_data.get('units_per_hour')
+
+            cur.execute("""
+                INSERT INTO t_p435659_order_management_sys.production_rates (material, units_per_hour)
+                VALUES (%s, %s)
+                ON CONFLICT (material)
+                DO UPDATE SET units_per_hour = EXCLUDED.units_per_hour, updated_at = CURRENT_TIMESTAMP
+            """, (material, units_per_hour))
+            conn.commit()
+
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True}),
+                'isBase64Encoded': False
+            }
+
+        cur.close()
+        conn.close()
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
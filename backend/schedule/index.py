@@ -7,8 +7,43 @@ Returns: HTTP response с данными графика или результа
 import json
 import os
 import psycopg2
-from typing import Dict, Any
-from datetime import datetime
+from psycopg2.extras import execute_values
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import date, datetime
+
+AUDIT_SKIP_FIELDS = ('password', 'updated_at')
+
+AuditRecord = Tuple[str, Any, str, Optional[int], str]    # (entity, entity_id, action, actor_id, changes)
+
+def get_actor_id(event: Dict[str, Any]) -> Optional[int]:
+    '''Пользователь из заголовка X-User-Id. Заголовок не проверяется: это заявленный панелью, а не аутентифицированный пользователь'''
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'x-user-id' and str(value).isdigit():
+            return int(value)
+    return None
+
+def audit(records: List[AuditRecord], entity: str, entity_id: Any, action: str, actor_id: Optional[int],
+          before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    before = before or {}
+    after = after or {}
+    changes = {
+        field: [before.get(field), after.get(field)]
+        for field in set(before) | set(after)
+        if field not in AUDIT_SKIP_FIELDS and before.get(field) != after.get(field)
+    }
+    if action == 'update' and not changes:
+        return
+    records.append((entity, entity_id, action, actor_id, json.dumps(changes, default=str)))
+
+def flush_audit(cur: Any, records: List[AuditRecord]) -> None:
+    if not records:
+        return
+    execute_values(cur, """
+        INSERT INTO t_p435659_order_management_sys.audit_log (entity, entity_id, action, actor_id, changes)
+        VALUES %s
+    """, records)
+    records.clear()
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -27,6 +62,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     database_url = os.environ.get('DATABASE_URL')
+    actor_id = get_actor_id(event)
+    # Записи журнала изменений этого запроса; пишутся одной вставкой перед фиксацией транзакции
+    audit_records: List[AuditRecord] = []
     
     try:
         conn = psycopg2.connect(database_url)
@@ -42,16 +80,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 year = str(now.year)
                 month = str(now.month)
             
+            try:
+                month_start = date(int(year), int(month), 1)
+            except ValueError:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Неверный год или месяц'}),
+                    'isBase64Encoded': False
+                }
+            next_month = date(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+            
             cur.execute("""
                 SELECT 
                     s.id, s.user_id, s.work_date, s.hours,
                     u.full_name, u.login
                 FROM t_p435659_order_management_sys.schedule s
                 JOIN t_p435659_order_management_sys.users u ON s.user_id = u.id
-                WHERE EXTRACT(YEAR FROM s.work_date) = %s 
-                  AND EXTRACT(MONTH FROM s.work_date) = %s
+                WHERE s.work_date >= %s
+                  AND s.work_date < %s
                 ORDER BY s.work_date, u.full_name
-            """, (year, month))
+            """, (month_start, next_month))
             
             records = cur.fetchall()
             
@@ -92,16 +146,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             work_date = body_data.get('work_date')
             hours = body_data.get('hours', 0)
             
+            # prev - прежние часы, если запись на этот день уже была; блокировка строки ждёт параллельное
+            # изменение и читает зафиксированное значение, а не снимок начала запроса.
+            # prev соединяется с источником вставки, чтобы выполниться до неё: после вставки FOR UPDATE
+            # пропустил бы строку, изменённую этой же командой
             cur.execute("""
+                WITH prev AS (
+                    SELECT hours FROM t_p435659_order_management_sys.schedule
+                    WHERE user_id = %s AND work_date = %s
+                    FOR UPDATE
+                )
                 INSERT INTO t_p435659_order_management_sys.schedule 
                 (user_id, work_date, hours) 
-                VALUES (%s, %s, %s)
+                SELECT %s, %s, %s FROM (VALUES (1)) v LEFT JOIN prev ON true
                 ON CONFLICT (user_id, work_date) 
                 DO UPDATE SET hours = %s, updated_at = CURRENT_TIMESTAMP
-                RETURNING id
-            """, (user_id, work_date, hours, hours))
+                RETURNING id, (SELECT hours FROM prev), hours
+            """, (user_id, work_date, user_id, work_date, hours, hours))
             
-            schedule_id = cur.fetchone()[0]
+            schedule_id, before_hours, after_hours = cur.fetchone()
+            if before_hours is None:
+                audit(audit_records, 'schedule', schedule_id, 'create', actor_id, None,
+                      {'user_id': user_id, 'work_date': work_date, 'hours': float(after_hours)})
+            else:
+                audit(audit_records, 'schedule', schedule_id, 'update', actor_id,
+                      {'hours': float(before_hours)}, {'hours': float(after_hours)})
+            flush_audit(cur, audit_records)
             conn.commit()
             
             cur.close()
@@ -122,11 +192,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             hours = body_data.get('hours', 0)
             
             cur.execute("""
-                UPDATE t_p435659_order_management_sys.schedule 
+                WITH prev AS (
+                    SELECT id, hours FROM t_p435659_order_management_sys.schedule
+                    WHERE id = %s
+                    FOR UPDATE
+                )
+                UPDATE t_p435659_order_management_sys.schedule s
                 SET hours = %s, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = %s
-            """, (hours, schedule_id))
+                FROM prev
+                WHERE s.id = prev.id
+                RETURNING prev.hours, s.hours
+            """, (schedule_id, hours))
+            for before_hours, after_hours in cur.fetchall():
+                audit(audit_records, 'schedule', schedule_id, 'update', actor_id,
+                      {'hours': float(before_hours)}, {'hours': float(after_hours)})
             
+            flush_audit(cur, audit_records)
             conn.commit()
             cur.close()
             conn.close()
@@ -7,7 +7,42 @@ Returns: HTTP response со списком пользователей или р
 import json
 import os
 import psycopg2
-from typing import Dict, Any
+from psycopg2.extras import execute_values
+from typing import Dict, Any, List, Optional, Tuple
+
+AUDIT_SKIP_FIELDS = ('password', 'updated_at')
+
+AuditRecord = Tuple[str, Any, str, Optional[int], str]    # (entity, entity_id, action, actor_id, changes)
+
+def get_actor_id(event: Dict[str, Any]) -> Optional[int]:
+    '''Пользователь из заголовка X-User-Id. Заголовок не проверяется: это заявленный панелью, а не аутентифицированный пользователь'''
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'x-user-id' and str(value).isdigit():
+            return int(value)
+    return None
+
+def audit(records: List[AuditRecord], entity: str, entity_id: Any, action: str, actor_id: Optional[int],
+          before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    before = before or {}
+    after = after or {}
+    changes = {
+        field: [before.get(field), after.get(field)]
+        for field in set(before) | set(after)
+        if field not in AUDIT_SKIP_FIELDS and before.get(field) != after.get(field)
+    }
+    if action == 'update' and not changes:
+        return
+    records.append((entity, entity_id, action, actor_id, json.dumps(changes, default=str)))
+
+def flush_audit(cur: Any, records: List[AuditRecord]) -> None:
+    if not records:
+        return
+    execute_values(cur, """
+        INSERT INTO audit_log (entity, entity_id, action, actor_id, changes)
+        VALUES %s
+    """, records)
+    records.clear()
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -26,6 +61,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     database_url = os.environ.get('DATABASE_URL')
+    actor_id = get_actor_id(event)
+    # Записи журнала изменений этого запроса; пишутся одной вставкой перед фиксацией транзакции
+    audit_records: List[AuditRecord] = []
     
     try:
         conn = psycopg2.connect(database_url)
@@ -87,6 +125,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 (login, password, role, full_name)
             )
             user_id = cur.fetchone()[0]
+            audit(audit_records, 'user', user_id, 'create', actor_id, None, {
+                'login': login,
+                'role': role,
+                'full_name': full_name
+            })
+            flush_audit(cur, audit_records)
             conn.commit()
             
             cur.close()
@@ -105,7 +149,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body_data = json.loads(event.get('body', '{}'))
             user_id = body_data.get('id')
             
-            cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            cur.execute("DELETE FROM users u WHERE u.id = %s RETURNING row_to_json(u)", (user_id,))
+            for deleted in cur.fetchall():
+                audit(audit_records, 'user', user_id, 'delete', actor_id, deleted[0], None)
+            flush_audit(cur, audit_records)
             conn.commit()
             
             cur.close()
@@ -0,0 +1,28 @@
+-- Заявки по статусу в порядке создания (вкладки панели менеджера и работника)
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON t_p435659_order_management_sys.orders(status, created_at DESC);
+DROP INDEX IF EXISTS t_p435659_order_management_sys.idx_orders_status;
+
+-- Проверка внешнего ключа при удалении пользователя
+CREATE INDEX IF NOT EXISTS idx_orders_created_by ON t_p435659_order_management_sys.orders(created_by);
+
+-- Позиции заявки отдаются в порядке id
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id_id ON t_p435659_order_management_sys.order_items(order_id, id);
+DROP INDEX IF EXISTS t_p435659_order_management_sys.idx_order_items_order_id;
+
+-- Список работников в графике
+CREATE INDEX IF NOT EXISTS idx_users_workers_full_name ON t_p435659_order_management_sys.users(full_name) INCLUDE (id, login) WHERE role = 'worker';
+
+-- История остатков по материалу (и проверка внешнего ключа при удалении материала)
+CREATE INDEX IF NOT EXISTS idx_material_inventory_material_created ON t_p435659_order_management_sys.material_inventory(material_id, created_at);
+
+-- График за месяц выбирается диапазоном дат
+CREATE INDEX IF NOT EXISTS idx_schedule_work_date ON t_p435659_order_management_sys.schedule(work_date);
+
+-- Позиции удаляются вместе с заявкой
+DELETE FROM t_p435659_order_management_sys.order_items oi
+WHERE NOT EXISTS (SELECT 1 FROM t_p435659_order_management_sys.orders o WHERE o.id = oi.order_id);
+
+ALTER TABLE t_p435659_order_management_sys.order_items
+    ADD CONSTRAINT fk_order_items_order FOREIGN KEY (order_id)
+    REFERENCES t_p435659_order_management_sys.orders(id) ON DELETE CASCADE NOT VALID;
+-- Проверка существующих строк - в V0015, отдельной транзакцией (без блокировки записи в order_items)
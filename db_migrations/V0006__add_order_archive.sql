@@ -0,0 +1,19 @@
+-- Архив выполненных и отгруженных заявок: рабочие таблицы остаются небольшими
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.orders_archive (LIKE t_p435659_order_management_sys.orders);
+ALTER TABLE t_p435659_order_management_sys.orders_archive ADD PRIMARY KEY (id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_archive_order_number ON t_p435659_order_management_sys.orders_archive(order_number);
+CREATE INDEX IF NOT EXISTS idx_orders_archive_status_created_at ON t_p435659_order_management_sys.orders_archive(status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_archive_created_at ON t_p435659_order_management_sys.orders_archive(created_at);
+
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.order_items_archive (LIKE t_p435659_order_management_sys.order_items);
+ALTER TABLE t_p435659_order_management_sys.order_items_archive ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_order_items_archive_order_id_id ON t_p435659_order_management_sys.order_items_archive(order_id, id);
+
+-- Архив истории остатков
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.material_inventory_archive (LIKE t_p435659_order_management_sys.material_inventory);
+ALTER TABLE t_p435659_order_management_sys.material_inventory_archive ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_material_inventory_archive_material_created ON t_p435659_order_management_sys.material_inventory_archive(material_id, created_at);
+
+-- Отбор кандидатов на архивацию
+CREATE INDEX IF NOT EXISTS idx_orders_closed_updated_at ON t_p435659_order_management_sys.orders(updated_at) WHERE status IN ('completed', 'shipped');
+CREATE INDEX IF NOT EXISTS idx_material_inventory_created_at ON t_p435659_order_management_sys.material_inventory(created_at);
@@ -0,0 +1,64 @@
+-- Уведомления об изменениях заявок, позиций и остатков для ленты изменений (канал order_changes)
+-- Массовые операции (архивация, заполнение тестовыми данными) отключают их через SET oms.skip_notify = 'on'
+CREATE OR REPLACE FUNCTION t_p435659_order_management_sys.notify_change() RETURNS trigger AS $$
+DECLARE
+    payload JSON;
+BEGIN
+    IF current_setting('oms.skip_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_TABLE_NAME = 'orders' THEN
+        IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+            RETURN NULL;
+        END IF;
+        payload := json_build_object(
+            'table', 'orders',
+            'op', TG_OP,
+            'id', COALESCE(NEW.id, OLD.id),
+            'order_number', COALESCE(NEW.order_number, OLD.order_number),
+            'status', NEW.status
+        );
+    ELSIF TG_TABLE_NAME = 'order_items' THEN
+        IF TG_OP = 'UPDATE'
+           AND NEW.completed_quantity IS NOT DISTINCT FROM OLD.completed_quantity
+           AND NEW.quantity IS NOT DISTINCT FROM OLD.quantity THEN
+            RETURN NULL;
+        END IF;
+        payload := json_build_object(
+            'table', 'order_items',
+            'op', TG_OP,
+            'id', COALESCE(NEW.id, OLD.id),
+            'order_id', COALESCE(NEW.order_id, OLD.order_id),
+            'quantity', NEW.quantity,
+            'completed_quantity', NEW.completed_quantity
+        );
+    ELSE
+        IF TG_OP = 'UPDATE' AND NEW.quantity IS NOT DISTINCT FROM OLD.quantity THEN
+            RETURN NULL;
+        END IF;
+        payload := json_build_object(
+            'table', 'materials',
+            'op', TG_OP,
+            'id', COALESCE(NEW.id, OLD.id),
+            'quantity', NEW.quantity,
+            'delta', COALESCE(NEW.quantity, 0) - COALESCE(OLD.quantity, 0)
+        );
+    END IF;
+
+    PERFORM pg_notify('order_changes', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_orders_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON t_p435659_order_management_sys.orders
+    FOR EACH ROW EXECUTE FUNCTION t_p435659_order_management_sys.notify_change();
+
+CREATE TRIGGER trg_order_items_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON t_p435659_order_management_sys.order_items
+    FOR EACH ROW EXECUTE FUNCTION t_p435659_order_management_sys.notify_change();
+
+CREATE TRIGGER trg_materials_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON t_p435659_order_management_sys.materials
+    FOR EACH ROW EXECUTE FUNCTION t_p435659_order_management_sys.notify_change();
@@ -0,0 +1,9 @@
+-- Выработка по материалу (изделий в час на одного работника) для планирования производства
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.production_rates (
+    material VARCHAR(255) PRIMARY KEY,
+    units_per_hour DECIMAL(10, 2) NOT NULL CHECK (units_per_hour > 0),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Открытые заявки в порядке очереди
+CREATE INDEX IF NOT EXISTS idx_orders_open_created_at ON t_p435659_order_management_sys.orders(created_at, id) WHERE status IN ('created', 'in_progress');
@@ -0,0 +1,34 @@
+-- Счётчики изменений таблиц для проверки актуальности кэшей в функциях (один UPDATE на выражение, не на строку)
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.data_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO t_p435659_order_management_sys.data_versions (name)
+VALUES ('orders'), ('order_items'), ('materials'), ('material_inventory')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION t_p435659_order_management_sys.bump_data_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE t_p435659_order_management_sys.data_versions
+    SET version = version + 1
+    WHERE name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_orders_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p435659_order_management_sys.orders
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p435659_order_management_sys.bump_data_version();
+
+CREATE TRIGGER trg_order_items_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p435659_order_management_sys.order_items
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p435659_order_management_sys.bump_data_version();
+
+CREATE TRIGGER trg_materials_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p435659_order_management_sys.materials
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p435659_order_management_sys.bump_data_version();
+
+CREATE TRIGGER trg_material_inventory_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p435659_order_management_sys.material_inventory
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p435659_order_management_sys.bump_data_version();
@@ -0,0 +1,28 @@
+-- Учёт брака. order_item_id без внешнего ключа: позиция может быть перенесена в order_items_archive
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.defects (
+    id SERIAL PRIMARY KEY,
+    order_item_id INTEGER,
+    material_id INTEGER REFERENCES t_p435659_order_management_sys.materials(id) ON DELETE SET NULL,
+    worker_id INTEGER REFERENCES t_p435659_order_management_sys.users(id),
+    quantity DECIMAL(10, 2) NOT NULL CHECK (quantity > 0),
+    reason TEXT,
+    written_off BOOLEAN NOT NULL DEFAULT FALSE,
+    defect_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    created_by INTEGER REFERENCES t_p435659_order_management_sys.users(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_defects_defect_date ON t_p435659_order_management_sys.defects(defect_date);
+CREATE INDEX IF NOT EXISTS idx_defects_order_item_id ON t_p435659_order_management_sys.defects(order_item_id);
+CREATE INDEX IF NOT EXISTS idx_defects_material_id ON t_p435659_order_management_sys.defects(material_id);
+CREATE INDEX IF NOT EXISTS idx_defects_worker_id ON t_p435659_order_management_sys.defects(worker_id);
+
+-- Счётчики брака по материалу, работнику и дню; обновляются в той же транзакции, что и записи брака
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.defect_rollups (
+    dimension VARCHAR(20) NOT NULL CHECK (dimension IN ('material', 'worker', 'day')),
+    dim_id INTEGER NOT NULL,
+    defect_date DATE NOT NULL,
+    defect_count INTEGER NOT NULL DEFAULT 0,
+    defect_quantity DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, defect_date, dim_id)
+);
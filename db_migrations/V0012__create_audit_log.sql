@@ -0,0 +1,13 @@
+-- Журнал изменений: кто и что изменил (changes - {поле: [было, стало]})
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.audit_log (
+    id BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(50) NOT NULL,
+    entity_id INTEGER,
+    action VARCHAR(20) NOT NULL,
+    actor_id INTEGER,
+    changes JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON t_p435659_order_management_sys.audit_log(entity, entity_id, id);
+CREATE INDEX IF NOT EXISTS idx_audit_log_actor ON t_p435659_order_management_sys.audit_log(actor_id, id);
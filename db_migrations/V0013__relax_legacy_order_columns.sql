@@ -0,0 +1,17 @@
+-- Позиции заявки хранятся в order_items; обработчик заявок создаёт заявку без material/quantity,
+-- поэтому старые обязательные колонки orders из V0001 (и их копии в orders_archive из V0006) делаются необязательными
+DO $$
+DECLARE
+    legacy_table TEXT;
+    legacy_column TEXT;
+BEGIN
+    FOR legacy_table, legacy_column IN
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = 't_p435659_order_management_sys'
+          AND table_name IN ('orders', 'orders_archive')
+          AND column_name IN ('material', 'quantity')
+          AND is_nullable = 'NO'
+    LOOP
+        EXECUTE format('ALTER TABLE t_p435659_order_management_sys.%I ALTER COLUMN %I DROP NOT NULL', legacy_table, legacy_column);
+    END LOOP;
+END $$;
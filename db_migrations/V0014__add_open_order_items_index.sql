@@ -0,0 +1,4 @@
+-- Незавершённые позиции (план производства, прогноз потребности): ~3% order_items, без полного просмотра таблицы
+CREATE INDEX IF NOT EXISTS idx_order_items_open ON t_p435659_order_management_sys.order_items(order_id)
+    INCLUDE (material, size, color, quantity, completed_quantity)
+    WHERE quantity > COALESCE(completed_quantity, 0);
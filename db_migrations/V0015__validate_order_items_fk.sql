@@ -0,0 +1,3 @@
+-- Проверка существующих позиций для ключа из V0005: VALIDATE берёт SHARE UPDATE EXCLUSIVE и не блокирует запись,
+-- но только в своей транзакции - в одной транзакции с ADD CONSTRAINT блокировка ADD держалась бы до конца проверки
+ALTER TABLE t_p435659_order_management_sys.order_items VALIDATE CONSTRAINT fk_order_items_order;
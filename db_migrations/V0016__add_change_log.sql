@@ -0,0 +1,64 @@
+-- Журнал изменений для ленты: курсор клиента - горизонт транзакций (txid_snapshot_xmin), поэтому продолжить
+-- чтение может любой экземпляр функции. Транзакции с txid ниже горизонта завершены, и окно [курсор, горизонт)
+-- не пропускает транзакцию, которая получила txid раньше, а зафиксировалась позже соседей. NOTIFY остаётся сигналом пробуждения.
+CREATE TABLE IF NOT EXISTS t_p435659_order_management_sys.change_log (
+    id BIGSERIAL PRIMARY KEY,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_log_txid ON t_p435659_order_management_sys.change_log(txid, id);
+CREATE INDEX IF NOT EXISTS idx_change_log_created_at ON t_p435659_order_management_sys.change_log(created_at);
+
+CREATE OR REPLACE FUNCTION t_p435659_order_management_sys.notify_change() RETURNS trigger AS $$
+DECLARE
+    payload JSON;
+BEGIN
+    IF current_setting('oms.skip_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_TABLE_NAME = 'orders' THEN
+        IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+            RETURN NULL;
+        END IF;
+        payload := json_build_object(
+            'table', 'orders',
+            'op', TG_OP,
+            'id', COALESCE(NEW.id, OLD.id),
+            'order_number', COALESCE(NEW.order_number, OLD.order_number),
+            'status', NEW.status
+        );
+    ELSIF TG_TABLE_NAME = 'order_items' THEN
+        IF TG_OP = 'UPDATE'
+           AND NEW.completed_quantity IS NOT DISTINCT FROM OLD.completed_quantity
+           AND NEW.quantity IS NOT DISTINCT FROM OLD.quantity THEN
+            RETURN NULL;
+        END IF;
+        payload := json_build_object(
+            'table', 'order_items',
+            'op', TG_OP,
+            'id', COALESCE(NEW.id, OLD.id),
+            'order_id', COALESCE(NEW.order_id, OLD.order_id),
+            'quantity', NEW.quantity,
+            'completed_quantity', NEW.completed_quantity
+        );
+    ELSE
+        IF TG_OP = 'UPDATE' AND NEW.quantity IS NOT DISTINCT FROM OLD.quantity THEN
+            RETURN NULL;
+        END IF;
+        payload := json_build_object(
+            'table', 'materials',
+            'op', TG_OP,
+            'id', COALESCE(NEW.id, OLD.id),
+            'quantity', NEW.quantity,
+            'delta', COALESCE(NEW.quantity, 0) - COALESCE(OLD.quantity, 0)
+        );
+    END IF;
+
+    INSERT INTO t_p435659_order_management_sys.change_log (payload) VALUES (payload);
+    PERFORM pg_notify('order_changes', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,18 @@
+-- Счётчики изменений таблиц на последовательностях вместо строк data_versions (V0010).
+-- UPDATE строки счётчика держал блокировку до конца транзакции: все записи в таблицу шли по очереди,
+-- а транзакции, менявшие orders и order_items в разном порядке, взаимно блокировались.
+-- nextval не берёт блокировок строк и не откатывается: лишнее увеличение даёт только лишний промах кэша.
+-- Значение видно до фиксации транзакции, поэтому кэши по этим счётчикам дополнительно ограничены по времени.
+CREATE SEQUENCE IF NOT EXISTS t_p435659_order_management_sys.orders_data_version;
+CREATE SEQUENCE IF NOT EXISTS t_p435659_order_management_sys.order_items_data_version;
+CREATE SEQUENCE IF NOT EXISTS t_p435659_order_management_sys.materials_data_version;
+CREATE SEQUENCE IF NOT EXISTS t_p435659_order_management_sys.material_inventory_data_version;
+
+CREATE OR REPLACE FUNCTION t_p435659_order_management_sys.bump_data_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM nextval(format('%I.%I', TG_TABLE_SCHEMA, TG_TABLE_NAME || '_data_version'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TABLE IF EXISTS t_p435659_order_management_sys.data_versions;
@@ -0,0 +1,91 @@
+'''
+Business: Замер времени ответа обработчиков backend/*/index.py на заполненной БД (сравнение до/после изменений)
+Args: DATABASE_URL в окружении; --repeat (число повторов), --case function:METHOD[:query] (можно несколько раз),
+      --body (JSON-тело для всех сценариев), --actor (X-User-Id), --no-audit (flush_audit не пишет журнал)
+Returns: Таблица min / медиана / p95 в миллисекундах по каждому сценарию
+
+Пример: DATABASE_URL=postgres://... python scripts/bench_handlers.py --repeat 20
+        git stash && python scripts/bench_handlers.py && git stash pop && python scripts/bench_handlers.py
+        Стоимость журнала изменений на записи (сценарий меняет данные при каждом повторе):
+        python scripts/bench_handlers.py --case materials:PUT --body '{"id": 1, "quantity_change": 1}' --actor 1 [--no-audit]
+'''
+
+import argparse
+import importlib.util
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+
+DEFAULT_CASES = [
+    'orders:GET',
+    'orders:GET:status=created',
+    'orders:GET:status=in_progress',
+    'orders:GET:id=1',
+    'schedule:GET:year=2025&month=6',
+    'materials:GET',
+    'users:GET',
+]
+
+
+def load_handler(function: str, audit: bool) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    spec = importlib.util.spec_from_file_location(f'bench_{function}', BACKEND / function / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not audit and hasattr(module, 'flush_audit'):
+        module.flush_audit = lambda cur, records: records.clear()
+    return module.handler
+
+
+def parse_case(case: str, body: str, actor: str) -> Tuple[str, Dict[str, Any]]:
+    function, method, *query = case.split(':', 2)
+    event = {
+        'httpMethod': method,
+        'headers': {'X-User-Id': actor} if actor else {},
+        'queryStringParameters': dict(parse_qsl(query[0])) if query else {},
+        'body': body,
+        'isBase64Encoded': False,
+    }
+    return function, event
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Замер времени ответа обработчиков')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--case', action='append', dest='cases')
+    parser.add_argument('--body', type=json.loads, default=None)
+    parser.add_argument('--actor', default='')
+    parser.add_argument('--no-audit', action='store_true')
+    args = parser.parse_args()
+    body = json.dumps(args.body) if args.body is not None else ''
+
+    handlers: Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]] = {}
+    print(f'{"сценарий":40} {"min":>9} {"median":>9} {"p95":>9}  status')
+    for case in args.cases or DEFAULT_CASES:
+        function, event = parse_case(case, body, args.actor)
+        if function not in handlers:
+            handlers[function] = load_handler(function, not args.no_audit)
+        handler = handlers[function]
+        response = handler(event, None)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = handler(event, None)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f'{case:40} {min(timings):9.1f} {statistics.median(timings):9.1f} '
+              f'{percentile(timings, 0.95):9.1f}  {response["statusCode"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
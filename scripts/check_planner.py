@@ -0,0 +1,108 @@
+'''
+Business: Проверка планировщика backend/planning без БД: время полного планирования и совпадение инкрементального пересчёта с полным
+Args: --items, --workers, --days (размер задачи), --edits (число случайных правок), --seed, --repeat
+Returns: Время полного плана (min / медиана) и число расхождений; код выхода 1, если инкрементальный план отличается от полного
+
+Пример: python scripts/check_planner.py --items 10000 --workers 100 --days 30 --edits 200
+'''
+
+import argparse
+import importlib.util
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, List, Tuple
+
+PLANNING = Path(__file__).resolve().parent.parent / 'backend' / 'planning' / 'index.py'
+MATERIALS = ['Ткань', 'Молния', 'Пуговицы', 'Нитки', 'Подкладка']
+
+
+def load_planning() -> Any:
+    spec = importlib.util.spec_from_file_location('check_planning', PLANNING)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_items(rng: random.Random, count: int) -> List[Tuple[int, int, str, float]]:
+    items = []
+    for item_id in range(1, count + 1):
+        items.append((item_id, (item_id - 1) // 3 + 1, rng.choice(MATERIALS), rng.uniform(0.5, 12.0)))
+    return items
+
+
+def make_slots(rng: random.Random, workers: int, days: int) -> List[Tuple[date, int, float]]:
+    start = date(2025, 1, 1)
+    return [(start + timedelta(days=day), user_id, float(rng.choice((4, 6, 8, 8, 8, 10))))
+            for day in range(days) for user_id in range(1, workers + 1)]
+
+
+def edit(rng: random.Random, items: List[Any], slots: List[Any]) -> Tuple[str, List[Any], List[Any]]:
+    '''Одна случайная правка, как между двумя запросами: новая копия списков'''
+    items = list(items)
+    slots = list(slots)
+    kind = rng.choice(('item_hours', 'item_done', 'item_new', 'slot_hours', 'slot_removed'))
+    if kind == 'item_hours' and items:
+        index = rng.randrange(len(items))
+        items[index] = items[index][:3] + (rng.uniform(0.5, 12.0),)
+    elif kind == 'item_done' and items:
+        del items[rng.randrange(len(items))]
+    elif kind == 'slot_hours' and slots:
+        index = rng.randrange(len(slots))
+        slots[index] = slots[index][:2] + (float(rng.choice((0.5, 2, 4, 8, 12))),)
+    elif kind == 'slot_removed' and slots:
+        del slots[rng.randrange(len(slots))]
+    else:
+        kind = 'item_new'
+        next_id = max((item[0] for item in items), default=0) + 1
+        items.append((next_id, next_id, rng.choice(MATERIALS), rng.uniform(0.5, 12.0)))
+    return kind, items, slots
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Проверка инкрементального планировщика')
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=100)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--edits', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    planning = load_planning()
+    rng = random.Random(args.seed)
+    items = make_items(rng, args.items)
+    slots = make_slots(rng, args.workers, args.days)
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        planning.Planner().sync(items, slots)
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f'полный план: {len(items)} позиций, {len(slots)} слотов - '
+          f'min {min(timings):.1f} мс, медиана {statistics.median(timings):.1f} мс')
+
+    incremental = planning.Planner()
+    incremental.sync(items, slots)
+    mismatches = 0
+    incremental_timings = []
+    for number in range(1, args.edits + 1):
+        kind, items, slots = edit(rng, items, slots)
+        started = time.perf_counter()
+        incremental.sync(items, slots)
+        incremental_timings.append((time.perf_counter() - started) * 1000)
+        full = planning.Planner()
+        full.sync(items, slots)
+        if incremental.assignments != full.assignments or incremental.checkpoints != full.checkpoints:
+            mismatches += 1
+            print(f'правка {number} ({kind}): инкрементальный план отличается от полного')
+    print(f'инкрементальный пересчёт: {args.edits} правок, медиана {statistics.median(incremental_timings):.1f} мс, '
+          f'расхождений с полным планом: {mismatches}')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
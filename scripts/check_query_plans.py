@@ -0,0 +1,213 @@
+'''
+Business: Регрессионная проверка планов запросов всех SQL-выражений из backend/*/index.py
+Args: DATABASE_URL в окружении (заполненная БД, см. seed.py); --budgets (файл бюджетов), --list (только вывести выражения)
+Returns: Код выхода 1, если выражение перешло на Seq Scan по большой таблице или превысило бюджет стоимости
+
+Выражения извлекаются из вызовов cur.execute(...) со строковым литералом; динамический SQL, SET/RESET и многострочные
+вставки execute_values(cur, ...) (VALUES %s раскрывается на клиенте) выводятся как SKIP. Запросы выгрузки
+собираются через export.build_query для каждого типа, с архивом и без, за последний месяц данных (id export:<тип>),
+и объясняются с настройками сессии выгрузки (export.tune_planner).
+Бюджет с id, которому не соответствует ни одно выражение, считается ошибкой: его нужно обновить или удалить. Каждое готовится через PREPARE
+и объясняется как обобщённый план (plan_cache_mode = force_generic_plan), поэтому параметры не нужны —
+планировщик видит их так же, как при реальном выполнении с неизвестными значениями.
+Запуск: DATABASE_URL=postgres://... python scripts/check_query_plans.py
+'''
+
+import argparse
+import ast
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / 'backend'
+SCHEMA = 't_p435659_order_management_sys'
+DEFAULT_BUDGETS = Path(__file__).resolve().parent / 'plan_budgets.json'
+EXPORT = BACKEND / 'export' / 'index.py'
+EXPORT_WINDOW_DAYS = 31
+
+
+def normalize(sql: str) -> str:
+    return ' '.join(sql.split())
+
+
+def statement_id(function: str, sql: str) -> str:
+    return f'{function}:{hashlib.sha1(normalize(sql).encode()).hexdigest()[:10]}'
+
+
+def extract_statements() -> Iterator[Tuple[str, str, int, Optional[str], Optional[str]]]:
+    '''Возвращает (функция, файл, строка, sql, причина пропуска); sql = None для динамически собранных выражений'''
+    for path in sorted(BACKEND.glob('*/index.py')):
+        function = path.parent.name
+        relative = str(path.relative_to(ROOT))
+        tree = ast.parse(path.read_text(encoding='utf-8'))
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call):
+                continue
+            if isinstance(node.func, ast.Name) and node.func.id == 'execute_values' and len(node.args) > 1:
+                arg = node.args[1]
+                sql = arg.value if isinstance(arg, ast.Constant) and isinstance(arg.value, str) else None
+                yield function, relative, node.lineno, sql, 'execute_values'
+                continue
+            if not isinstance(node.func, ast.Attribute) or node.func.attr != 'execute' or not node.args:
+                continue
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                # SET/RESET не планируются: PREPARE принимает только SELECT/INSERT/UPDATE/DELETE/MERGE/VALUES
+                utility = arg.value.split(None, 1)[0].upper() in ('SET', 'RESET')
+                yield function, relative, node.lineno, arg.value, 'utility' if utility else None
+            else:
+                yield function, relative, node.lineno, None, 'dynamic'
+
+
+def load_export() -> Any:
+    spec = importlib.util.spec_from_file_location('check_export', EXPORT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def export_statements(cur, export: Any) -> Iterator[Tuple[str, str, str]]:
+    '''Возвращает (id, место, sql) для каждой выгрузки с архивом и без, за последние EXPORT_WINDOW_DAYS дней данных'''
+    cur.execute(f'SELECT MAX(created_at)::date FROM {SCHEMA}.orders')
+    date_to = cur.fetchone()[0]
+    date_from = date_to - timedelta(days=EXPORT_WINDOW_DAYS - 1) if date_to else None
+    location = f'{EXPORT.relative_to(ROOT)}:build_query'
+    for export_type in export.EXPORTS:
+        for include_archive in (False, True):
+            sid = f"export:{export_type}{':archive' if include_archive else ''}"
+            yield sid, location, export.build_query(cur, export_type, date_from, date_to, None, include_archive)
+
+
+def to_prepared(sql: str) -> Tuple[str, int]:
+    counter = 0
+
+    def repl(match: 're.Match[str]') -> str:
+        nonlocal counter
+        if match.group(0) == '%%':
+            return '%'
+        counter += 1
+        return f'${counter}'
+
+    return re.sub(r'%%|%s', repl, sql), counter
+
+
+def walk_plan(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+
+def explain(cur, sql: str) -> Dict[str, Any]:
+    prepared, params = to_prepared(sql)
+    cur.execute('DEALLOCATE ALL')
+    cur.execute(f'PREPARE plan_check AS {prepared}')
+    args = ', '.join(['NULL'] * params)
+    cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE plan_check{f'({args})' if params else ''}")
+    return cur.fetchone()[0][0]['Plan']
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Проверка планов SQL-запросов бэкенда')
+    parser.add_argument('--budgets', type=Path, default=DEFAULT_BUDGETS)
+    parser.add_argument('--list', action='store_true', help='вывести найденные выражения без обращения к БД')
+    args = parser.parse_args()
+
+    statements = sorted(extract_statements(), key=lambda s: (s[1], s[2]))
+
+    if args.list:
+        for function, path, line, sql, skip in statements:
+            sid = statement_id(function, sql) if sql else f'{function}:dynamic'
+            print(f'{sid}  {path}:{line}{f"  [SKIP: {skip}]" if skip else ""}')
+            print(f'    {normalize(sql) if sql else "<динамический SQL, не проверяется>"}')
+        print(f'export:<тип>[:archive]  {EXPORT.relative_to(ROOT)}:build_query')
+        print('    <собирается через export.build_query при проверке>')
+        return 0
+
+    import psycopg2
+
+    budgets = json.loads(args.budgets.read_text(encoding='utf-8'))
+    default_cost = budgets.get('default_max_cost')
+    min_rows = budgets.get('min_seq_scan_rows', 10000)
+    overrides: Dict[str, Dict[str, Any]] = budgets.get('statements', {})
+
+    conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    cur = conn.cursor()
+    cur.execute(f'SET search_path TO {SCHEMA}, public')
+    cur.execute('SET plan_cache_mode = force_generic_plan')
+    cur.execute("""
+        SELECT c.relname, c.reltuples
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+    """, (SCHEMA,))
+    table_rows = {name: rows for name, rows in cur.fetchall()}
+
+    # (id, место, sql, причина пропуска, настройка сессии) - выражения из исходников и запросы выгрузки
+    checks: List[Tuple[str, str, Optional[str], Optional[str], Optional[Callable[[Any], None]]]] = []
+    for function, path, line, sql, skip in statements:
+        if function == 'export' and skip == 'dynamic':
+            # Запрос выгрузки, собранный build_query: проверяется ниже как export:<тип>
+            continue
+        checks.append((statement_id(function, sql) if sql else f'{function}:dynamic', f'{path}:{line}', sql, skip, None))
+    export = load_export()
+    checks += [(sid, location, sql, None, export.tune_planner) for sid, location, sql in export_statements(cur, export)]
+
+    failures: List[str] = []
+    for sid in sorted(set(overrides) - {check[0] for check in checks}):
+        failures.append(f'{sid}: бюджет не соответствует ни одному выражению')
+        print(f'FAIL  {sid}  бюджет не соответствует ни одному выражению')
+
+    checked = 0
+    skipped = 0
+    for sid, location, sql, skip, setup in checks:
+        if skip:
+            skipped += 1
+            print(f'SKIP  {sid}  {skip}  {location}')
+            continue
+        rules = overrides.get(sid, {})
+        allowed = set(rules.get('allow_seq_scan', []))
+        max_cost = rules.get('max_cost', default_cost)
+        cur.execute('SAVEPOINT plan_check')
+        try:
+            if setup:
+                setup(cur)
+            plan = explain(cur, sql)
+        except psycopg2.Error as e:
+            cur.execute('ROLLBACK TO SAVEPOINT plan_check')
+            failures.append(f'{sid} {location}: не удалось построить план: {e.pgerror or e}'.strip())
+            print(f'FAIL  {sid}  не удалось построить план  {location}')
+            continue
+        # Откат, а не RELEASE: настройки сессии выгрузки не должны влиять на следующие выражения
+        cur.execute('ROLLBACK TO SAVEPOINT plan_check')
+        checked += 1
+        problems = []
+        for node in walk_plan(plan):
+            relation = node.get('Relation Name')
+            if node.get('Node Type') == 'Seq Scan' and relation not in allowed:
+                if table_rows.get(relation, 0) >= min_rows:
+                    problems.append(f'Seq Scan по {relation} (~{int(table_rows[relation])} строк)')
+        cost = plan['Total Cost']
+        if max_cost is not None and cost > max_cost:
+            problems.append(f'стоимость {cost:.0f} > бюджета {max_cost}')
+        status = 'FAIL' if problems else 'ok'
+        print(f'{status:4}  {sid}  cost={cost:.0f}  {location}')
+        for problem in problems:
+            failures.append(f'{sid} {location}: {problem}')
+            print(f'      {problem}')
+
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+    print(f'\nПроверено выражений: {checked}, пропущено: {skipped}, ошибок: {len(failures)}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+'''
+Business: SSE-сервер ленты изменений на asyncio: одно подключение к БД на процесс, события рассылаются всем клиентам
+Args: DATABASE_URL в окружении; --host, --port
+Returns: GET /events отдаёт text/event-stream с событиями из change_log (см. V0016); id события - тот же курсор,
+         что у backend/feed, поэтому переподключение с Last-Event-ID (или ?cursor=) продолжает ленту без пропусков
+
+Для большого числа открытых панелей это основной способ отдачи ленты: long-poll функции backend/feed занимает
+экземпляр функции на каждого ожидающего клиента, а здесь все клиенты обслуживает одно подключение LISTEN.
+Доставка "хотя бы один раз": при обрыве посреди пачки часть событий придёт повторно.
+
+Пример: DATABASE_URL=postgres://... python scripts/feed_server.py --port 8090
+        curl -N http://localhost:8090/events
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Any, Dict, List, Set, Tuple
+from urllib.parse import parse_qsl
+
+import psycopg2
+
+CHANNEL = 'order_changes'
+CLIENT_QUEUE_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+RECHECK_SECONDS = 0.5
+MAX_BACKLOG = 1000
+
+
+class Feed:
+    def __init__(self, database_url: str) -> None:
+        self.database_url = database_url
+        self.clients: Set[asyncio.Queue] = set()
+        self.conn = None
+        self.horizon = 0
+        self.now = 0
+        self.recheck = None
+        self.target = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.conn = psycopg2.connect(self.database_url)
+        self.conn.autocommit = True
+        self.conn.cursor().execute(f'LISTEN {CHANNEL}')
+        self.horizon, self.now, _ = self.read(0, 0)
+        loop.add_reader(self.conn.fileno(), self.on_readable)
+
+    def cursor(self) -> str:
+        return f'{self.horizon}.{self.now}'
+
+    def read(self, after: int, limit: int) -> Tuple[int, int, List[Dict[str, Any]]]:
+        '''Горизонт, время БД и события транзакций с txid в [after, горизонт) - как в backend/feed'''
+        cur = self.conn.cursor()
+        cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()), EXTRACT(EPOCH FROM now())::bigint")
+        horizon, now = cur.fetchone()
+        events: List[Dict[str, Any]] = []
+        if limit:
+            cur.execute("""
+                SELECT payload
+                FROM t_p435659_order_management_sys.change_log
+                WHERE txid >= %s AND txid < %s
+                ORDER BY id
+                LIMIT %s
+            """, (after, horizon, limit))
+            events = [r[0] for r in cur.fetchall()]
+        cur.close()
+        return horizon, now, events
+
+    @staticmethod
+    def encode(events: List[Dict[str, Any]], cursor: str) -> bytes:
+        # id ставится на последнее событие пачки: браузер запомнит курсор после всей пачки
+        lines = [f'data: {json.dumps(payload)}\n\n' for payload in events]
+        lines[-1] = f'id: {cursor}\n' + lines[-1]
+        return ''.join(lines).encode()
+
+    def on_readable(self) -> None:
+        self.conn.poll()
+        if not self.conn.notifies:
+            return
+        self.conn.notifies.clear()
+        # Уведомившая транзакция зафиксирована, значит её txid меньше xmax текущего снимка
+        cur = self.conn.cursor()
+        cur.execute("SELECT txid_snapshot_xmax(txid_current_snapshot())")
+        self.target = max(self.target, cur.fetchone()[0])
+        cur.close()
+        self.refresh()
+
+    def refresh(self) -> None:
+        if self.recheck is not None:
+            self.recheck.cancel()
+            self.recheck = None
+        horizon, now, events = self.read(self.horizon, sys.maxsize)
+        self.horizon, self.now = max(self.horizon, horizon), now
+        if events:
+            self.broadcast(self.encode(events, self.cursor()))
+        if self.horizon < self.target:
+            # Горизонт держит незавершённая соседняя транзакция (например, пачка архивации с skip_notify):
+            # перечитываем, пока он не пройдёт все уведомившие транзакции, а не один раз
+            self.recheck = asyncio.get_running_loop().call_later(RECHECK_SECONDS, self.refresh)
+
+    def broadcast(self, message: bytes) -> None:
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Медленный клиент не должен тормозить остальных: отключаем, он переподключится с Last-Event-ID
+                self.clients.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def backlog(self, cursor: str) -> bytes:
+        '''События между курсором клиента и текущим горизонтом; reset, если курсор нельзя продолжить'''
+        position, _, _ = cursor.partition('.')
+        if not position.isdigit():
+            return f'event: reset\nid: {self.cursor()}\ndata: {{}}\n\n'.encode()
+        _, _, events = self.read(int(position), MAX_BACKLOG + 1)
+        if len(events) > MAX_BACKLOG:
+            return f'event: reset\nid: {self.cursor()}\ndata: {{}}\n\n'.encode()
+        return self.encode(events, self.cursor()) if events else b''
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        request_line = await reader.readline()
+        headers: Dict[str, str] = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode(errors='replace').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        parts = request_line.decode(errors='replace').split()
+        path, _, query = parts[1].partition('?') if len(parts) > 1 else ('', '', '')
+        if len(parts) < 2 or parts[0] != 'GET' or path != '/events':
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await writer.drain()
+            writer.close()
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.clients.add(queue)
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-store\r\n'
+                     b'Access-Control-Allow-Origin: *\r\n'
+                     b'Connection: keep-alive\r\n\r\n')
+        resume = headers.get('last-event-id') or dict(parse_qsl(query)).get('cursor')
+        if resume:
+            # Пропущенное после обрыва до текущего горизонта; дальше клиент получает общие рассылки
+            writer.write(self.backlog(resume))
+        writer.write(f'event: hello\ndata: {json.dumps({"cursor": self.cursor()})}\n\n'.encode())
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    message = b': keepalive\n\n'
+                if message is None:
+                    break
+                writer.write(message)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(queue)
+            writer.close()
+
+
+async def run(host: str, port: int) -> None:
+    feed = Feed(os.environ.get('DATABASE_URL'))
+    feed.start(asyncio.get_running_loop())
+    server = await asyncio.start_server(feed.serve_client, host, port)
+    print(f'Лента изменений: http://{host}:{port}/events')
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='SSE-сервер ленты изменений')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
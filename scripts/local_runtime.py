@@ -0,0 +1,420 @@
+'''
+Business: Локальный эмулятор среды выполнения функций: каждая backend/<name>/index.py доступна по маршруту /<name>,
+          экземпляр функции - отдельный процесс Python (холодный старт с импортом модуля, затем тёплые вызовы)
+Args: --port, --concurrency (одновременных вызовов на экземпляр), --max-instances, --idle-ttl (секунды простоя до остановки
+      экземпляра), --timeout (секунды на вызов); DATABASE_URL и прочее окружение передаются экземплярам как есть
+Returns: HTTP-прокси к обработчикам; GET /__stats - время импорта, первого вызова и p50/p95 тёплых вызовов по функциям
+
+Пример: DATABASE_URL=postgres://... python scripts/local_runtime.py --port 8000 --idle-ttl 60
+        curl 'http://localhost:8000/orders?status=created' && curl http://localhost:8000/__stats
+'''
+
+import argparse
+import base64
+import importlib.util
+import itertools
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+SAMPLES = 10000
+REAP_INTERVAL = 1.0
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+# ---------------------------------------------------------------- экземпляр (дочерний процесс)
+
+def run_worker(index_path: Path, concurrency: int) -> int:
+    '''
+    Процесс экземпляра: импортирует модуль функции и выполняет вызовы из stdin.
+    Ответы идут в отдельный дескриптор, а stdout обработчика перенаправлен в stderr, как логи функции.
+    '''
+    channel = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+    sys.path.insert(0, str(index_path.parent))
+    os.chdir(index_path.parent)
+
+    started = time.perf_counter()
+    spec = importlib.util.spec_from_file_location('index', index_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['index'] = module
+    spec.loader.exec_module(module)
+    import_ms = (time.perf_counter() - started) * 1000
+    channel.write(json.dumps({'ready': True, 'import_ms': import_ms}) + '\n')
+
+    lock = threading.Lock()
+    first = [True]
+
+    def invoke(request: Dict[str, Any]) -> None:
+        with lock:
+            is_first, first[0] = first[0], False
+        context = SimpleNamespace(
+            request_id=request['event']['requestContext']['requestId'],
+            function_name=index_path.parent.name,
+            function_version='local',
+            memory_limit_in_mb=128
+        )
+        started = time.perf_counter()
+        try:
+            reply = {'response': module.handler(request['event'], context)}
+        except Exception:
+            reply = {'error': traceback.format_exc()}
+        reply.update(id=request['id'], duration_ms=(time.perf_counter() - started) * 1000, first=is_first)
+        line = json.dumps(reply, default=str) + '\n'
+        with lock:
+            channel.write(line)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        for line in sys.stdin:
+            pool.submit(invoke, json.loads(line))
+    return 0
+
+
+class Instance:
+    '''Экземпляр функции на стороне эмулятора: процесс, очередь ответов по id вызова, счётчик активных вызовов'''
+
+    def __init__(self, function: str, number: int, concurrency: int) -> None:
+        self.name = f'{function}#{number}'
+        started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), '--worker', str(BACKEND / function / 'index.py'),
+             '--concurrency', str(concurrency)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        ready = self.process.stdout.readline()
+        if not ready:
+            self.process.wait()
+            raise RuntimeError(f'{self.name}: ошибка импорта модуля (см. лог выше)')
+        self.import_ms: float = json.loads(ready)['import_ms']
+        self.start_ms = (time.perf_counter() - started) * 1000
+        self.inflight = 0
+        self.last_used = time.monotonic()
+        self.alive = True
+        self._ids = itertools.count()
+        self._pending: Dict[int, queue.Queue] = {}
+        self._write_lock = threading.Lock()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+
+    def _read_replies(self) -> None:
+        for line in self.process.stdout:
+            reply = json.loads(line)
+            waiter = self._pending.pop(reply['id'], None)
+            if waiter is not None:
+                waiter.put(reply)
+        # Процесс завершился: все ожидающие вызовы получают ошибку
+        self.alive = False
+        for waiter in list(self._pending.values()):
+            waiter.put({'error': f'{self.name}: процесс экземпляра завершился'})
+
+    def invoke(self, event: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        call_id = next(self._ids)
+        waiter: queue.Queue = queue.Queue(1)
+        self._pending[call_id] = waiter
+        try:
+            with self._write_lock:
+                self.process.stdin.write(json.dumps({'id': call_id, 'event': event}) + '\n')
+        except (BrokenPipeError, ValueError):
+            self._pending.pop(call_id, None)
+            self.alive = False
+            return {'error': f'{self.name}: процесс экземпляра завершился'}
+        try:
+            return waiter.get(timeout=timeout)
+        except queue.Empty:
+            # Как в облаке: экземпляр, не уложившийся в таймаут, останавливается
+            self._pending.pop(call_id, None)
+            self.stop()
+            return {'error': f'{self.name}: превышен таймаут {timeout} с', 'timeout': True}
+
+    def stop(self) -> None:
+        self.alive = False
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+# ---------------------------------------------------------------- пул экземпляров и метрики
+
+class FunctionPool:
+    '''
+    Экземпляры одной функции. Вызов получает самый недавно использованный экземпляр со свободным местом
+    (так держится минимум тёплых экземпляров), новый запускается, только если все заняты и не достигнут max_instances.
+    '''
+
+    def __init__(self, function: str, concurrency: int, max_instances: int) -> None:
+        self.function = function
+        self.concurrency = concurrency
+        self.max_instances = max_instances
+        self.instances: List[Instance] = []
+        self.starting = 0
+        self.numbers = itertools.count(1)
+        self.cond = threading.Condition()
+        self.cold_starts = 0
+        self.evictions = 0
+        self.errors = 0
+        self.samples: Dict[str, Deque[float]] = {
+            metric: deque(maxlen=SAMPLES)
+            for metric in ('start_ms', 'import_ms', 'first_ms', 'warm_ms', 'cold_total_ms', 'warm_total_ms', 'wait_ms')
+        }
+
+    def acquire(self) -> Tuple[Instance, bool]:
+        with self.cond:
+            while True:
+                self.instances = [i for i in self.instances if i.alive]
+                free = [i for i in self.instances if i.inflight < self.concurrency]
+                if free:
+                    instance = max(free, key=lambda i: i.last_used)
+                    instance.inflight += 1
+                    return instance, False
+                if len(self.instances) + self.starting < self.max_instances:
+                    self.starting += 1
+                    break
+                self.cond.wait()
+
+        try:
+            instance = Instance(self.function, next(self.numbers), self.concurrency)
+        finally:
+            with self.cond:
+                self.starting -= 1
+                self.cond.notify()
+        with self.cond:
+            instance.inflight = 1
+            self.instances.append(instance)
+            self.cold_starts += 1
+            self.samples['start_ms'].append(instance.start_ms)
+            self.samples['import_ms'].append(instance.import_ms)
+        return instance, True
+
+    def release(self, instance: Instance) -> None:
+        with self.cond:
+            instance.inflight -= 1
+            instance.last_used = time.monotonic()
+            self.cond.notify()
+
+    def record(self, cold: bool, total_ms: float, wait_ms: float, reply: Dict[str, Any]) -> None:
+        with self.cond:
+            self.samples['cold_total_ms' if cold else 'warm_total_ms'].append(total_ms)
+            self.samples['wait_ms'].append(wait_ms)
+            if 'response' not in reply:
+                self.errors += 1
+            if 'duration_ms' in reply:
+                self.samples['first_ms' if reply['first'] else 'warm_ms'].append(reply['duration_ms'])
+
+    def reap(self, idle_ttl: float) -> None:
+        now = time.monotonic()
+        with self.cond:
+            idle = [i for i in self.instances if i.inflight == 0 and now - i.last_used > idle_ttl]
+            self.instances = [i for i in self.instances if i not in idle]
+            self.evictions += len(idle)
+        for instance in idle:
+            instance.stop()
+
+    def stop(self) -> None:
+        with self.cond:
+            instances, self.instances = self.instances, []
+        for instance in instances:
+            instance.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            result: Dict[str, Any] = {
+                'instances': len(self.instances),
+                'busy': sum(1 for i in self.instances if i.inflight),
+                'cold_starts': self.cold_starts,
+                'evictions': self.evictions,
+                'errors': self.errors
+            }
+            for metric, values in self.samples.items():
+                if values:
+                    result[metric] = {
+                        'count': len(values),
+                        'p50': round(percentile(list(values), 0.5), 2),
+                        'p95': round(percentile(list(values), 0.95), 2),
+                        'max': round(max(values), 2)
+                    }
+            return result
+
+    def reset(self) -> None:
+        with self.cond:
+            self.cold_starts = self.evictions = self.errors = 0
+            for values in self.samples.values():
+                values.clear()
+
+
+# ---------------------------------------------------------------- HTTP
+
+def make_event(method: str, path: str, query: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+    try:
+        text, is_base64 = body.decode('utf-8'), False
+    except UnicodeDecodeError:
+        text, is_base64 = base64.b64encode(body).decode('ascii'), True
+    return {
+        'httpMethod': method,
+        'path': path,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(query, keep_blank_values=True)),
+        'body': text,
+        'isBase64Encoded': is_base64,
+        'requestContext': {'requestId': uuid.uuid4().hex, 'httpMethod': method}
+    }
+
+
+class Runtime:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        functions = args.functions or sorted(p.parent.name for p in BACKEND.glob('*/index.py'))
+        self.pools = {name: FunctionPool(name, args.concurrency, args.max_instances) for name in functions}
+        self.stopped = threading.Event()
+
+    def reaper(self) -> None:
+        while not self.stopped.wait(REAP_INTERVAL):
+            for pool in self.pools.values():
+                pool.reap(self.args.idle_ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def call(self, function: str, event: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Instance], bool]:
+        pool = self.pools[function]
+        started = time.perf_counter()
+        instance, cold = pool.acquire()
+        acquired = time.perf_counter()
+        try:
+            reply = instance.invoke(event, self.args.timeout)
+        finally:
+            pool.release(instance)
+        total_ms = (time.perf_counter() - started) * 1000
+        pool.record(cold, total_ms, 0.0 if cold else (acquired - started) * 1000, reply)
+        return reply, instance, cold
+
+
+def make_request_handler(runtime: Runtime) -> type:
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, str(value))
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_json(self, status: int, data: Any) -> None:
+            self.send(status, {'Content-Type': 'application/json'}, json.dumps(data, ensure_ascii=False, indent=2).encode())
+
+        def dispatch(self) -> None:
+            url = urlsplit(self.path)
+            function, _, rest = url.path.lstrip('/').partition('/')
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+
+            if function == '__stats':
+                if 'reset=true' in url.query:
+                    for pool in runtime.pools.values():
+                        pool.reset()
+                self.send_json(200, runtime.stats())
+                return
+            if function not in runtime.pools:
+                self.send_json(404, {'error': f'Функция {function!r} не найдена', 'functions': sorted(runtime.pools)})
+                return
+
+            event = make_event(self.command, '/' + rest, url.query, dict(self.headers.items()), body)
+            try:
+                reply, instance, cold = runtime.call(function, event)
+            except RuntimeError as e:
+                self.send_json(502, {'error': str(e)})
+                return
+
+            runtime_headers = {'X-Runtime-Instance': instance.name, 'X-Runtime-Cold': '1' if cold else '0'}
+            if 'response' not in reply:
+                sys.stderr.write(reply['error'] + '\n')
+                self.send_json(504 if reply.get('timeout') else 502, {'error': reply['error'].strip().splitlines()[-1]})
+                return
+
+            response = reply['response']
+            content = response.get('body') or ''
+            if response.get('isBase64Encoded'):
+                payload = base64.b64decode(content)
+            else:
+                payload = content.encode() if isinstance(content, str) else json.dumps(content).encode()
+            self.send(int(response.get('statusCode', 200)), {**response.get('headers', {}), **runtime_headers}, payload)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = dispatch
+
+        def log_message(self, format: str, *args: Any) -> None:
+            if not runtime.args.quiet:
+                super().log_message(format, *args)
+
+    return RequestHandler
+
+
+def print_summary(stats: Dict[str, Any]) -> None:
+    metrics = ('import_ms', 'first_ms', 'warm_ms')
+    print(f'\n{"функция":12} {"холодных":>9} ' + ' '.join(f'{m + " p50/p95":>22}' for m in metrics))
+    for name, data in stats.items():
+        if not data['cold_starts'] and 'warm_ms' not in data:
+            continue
+        cells = []
+        for metric in metrics:
+            value = data.get(metric)
+            cells.append(f'{value["p50"]:>10.1f} /{value["p95"]:>10.1f}' if value else f'{"-":>22}')
+        print(f'{name:12} {data["cold_starts"]:>9} ' + ' '.join(cells))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Локальный эмулятор среды выполнения функций backend/*')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--max-instances', type=int, default=10)
+    parser.add_argument('--idle-ttl', type=float, default=300)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--function', action='append', dest='functions')
+    parser.add_argument('--quiet', action='store_true')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(Path(args.worker), args.concurrency)
+
+    runtime = Runtime(args)
+    threading.Thread(target=runtime.reaper, daemon=True).start()
+    server = ThreadingHTTPServer((args.host, args.port), make_request_handler(runtime))
+    server.daemon_threads = True
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f'Функции: {", ".join(sorted(runtime.pools))}')
+    print(f'Эмулятор: http://{args.host}:{args.port}/<функция>, статистика: /__stats')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runtime.stopped.set()
+        server.server_close()
+        print_summary(runtime.stats())
+        for pool in runtime.pools.values():
+            pool.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
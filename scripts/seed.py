@@ -0,0 +1,346 @@
+'''
+Business: Генерация детерминированного набора данных производственного масштаба и загрузка в БД через COPY
+Args: DATABASE_URL в окружении; --scale (множитель объёма), --seed, --years, --jobs, --truncate
+Returns: Заполненные таблицы users, material_sections, materials, orders, order_items, material_inventory, schedule
+
+Пример: DATABASE_URL=postgres://... python scripts/seed.py --scale 4 --seed 42 --truncate --jobs 8
+При --scale 1 генерируется около 2.6 млн строк, при --scale 4 — около 10 млн.
+Один и тот же --seed даёт одинаковые данные (включая id) независимо от --jobs и порядка загрузки порций.
+На время COPY снимаются FK, вторичные индексы и пользовательские триггеры; после загрузки они восстанавливаются.
+'''
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from multiprocessing import Pool
+from typing import Any, Dict, List, Tuple
+
+import psycopg2
+
+SCHEMA = 't_p435659_order_management_sys'
+CHUNK_ROWS = 50000
+
+BASE_COUNTS = {
+    'managers': 50,
+    'workers': 450,
+    'sections': 25,
+    'materials': 5000,
+    'orders': 250000,
+    'inventory': 1000000,
+}
+
+FIRST_NAMES = ['Анна', 'Иван', 'Мария', 'Пётр', 'Елена', 'Сергей', 'Ольга', 'Дмитрий', 'Наталья', 'Алексей',
+               'Татьяна', 'Михаил', 'Ирина', 'Андрей', 'Светлана', 'Николай']
+LAST_NAMES = ['Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов', 'Новиков',
+              'Морозов', 'Волков', 'Соловьёв', 'Васильев', 'Зайцев', 'Павлов', 'Семёнов']
+MATERIAL_NAMES = ['Ткань', 'Нить', 'Молния', 'Пуговица', 'Подкладка', 'Кнопка', 'Лента', 'Резинка',
+                  'Флизелин', 'Кружево', 'Тесьма', 'Утеплитель']
+MATERIAL_TYPES = ['Основной', 'Фурнитура', 'Отделка', 'Упаковка']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+COLORS = ['Белый', 'Чёрный', 'Красный', 'Синий', 'Зелёный', 'Серый', 'Бежевый', 'Жёлтый']
+NOTES = ['Поступление', 'Списание в производство', 'Инвентаризация', 'Возврат поставщику']
+MAX_ITEMS_PER_ORDER = 7
+
+
+def counts_for(scale: float) -> Dict[str, int]:
+    return {name: max(1, int(value * scale)) for name, value in BASE_COUNTS.items()}
+
+
+def material_attrs(seed: int, index: int) -> Tuple[str, str, str]:
+    '''Атрибуты материала — чистая функция от индекса, чтобы позиции заявок ссылались на существующие материалы'''
+    rng = random.Random(f'{seed}:material:{index}')
+    name = f'{MATERIAL_NAMES[index % len(MATERIAL_NAMES)]} {index // len(MATERIAL_NAMES) + 1}'
+    return name, rng.choice(SIZES), rng.choice(COLORS)
+
+
+def fmt_ts(value: datetime) -> str:
+    return value.isoformat(' ', 'seconds')
+
+
+def gen_users(seed: int, counts: Dict[str, int]) -> Dict[str, io.StringIO]:
+    rng = random.Random(f'{seed}:users')
+    buf = io.StringIO()
+    # id 1 зарезервирован за администратором из V0001
+    buf.write('1\tadmin\tadminik\tadmin\tАдминистратор\t2020-01-01 00:00:00\n')
+    user_id = 2
+    for role, login_prefix in (('manager', 'manager'), ('worker', 'worker')):
+        for i in range(counts[role + 's']):
+            full_name = f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}'
+            buf.write(f'{user_id}\t{login_prefix}{i + 1:05d}\tpassword\t{role}\t{full_name}\t2020-01-01 00:00:00\n')
+            user_id += 1
+    buf.seek(0)
+    return {'users (id, login, password, role, full_name, created_at)': buf}
+
+
+def gen_sections(seed: int, counts: Dict[str, int]) -> Dict[str, io.StringIO]:
+    buf = io.StringIO()
+    for i in range(counts['sections']):
+        buf.write(f'{i + 1}\tРаздел {i + 1}\t\\N\t2020-01-01 00:00:00\n')
+    buf.seek(0)
+    return {'material_sections (id, name, description, created_at)': buf}
+
+
+def gen_materials(seed: int, counts: Dict[str, int], start: int, stop: int) -> Dict[str, io.StringIO]:
+    rng = random.Random(f'{seed}:materials:{start}')
+    buf = io.StringIO()
+    for index in range(start, stop):
+        name, size, color = material_attrs(seed, index)
+        quantity = rng.randint(0, 5000)
+        material_type = rng.choice(MATERIAL_TYPES)
+        section_id = index % counts['sections'] + 1
+        buf.write(f'{index + 1}\t{name}\t{size}\t{color}\t{quantity}\t{material_type}\t\t{section_id}\t'
+                  f'2020-01-01 00:00:00\t2020-01-01 00:00:00\n')
+    buf.seek(0)
+    return {'materials (id, name, size, color, quantity, material_type, image_url, section_id, created_at, updated_at)': buf}
+
+
+def gen_orders(seed: int, counts: Dict[str, int], start: int, stop: int, until: date, years: int) -> Dict[str, io.StringIO]:
+    rng = random.Random(f'{seed}:orders:{start}')
+    orders_buf = io.StringIO()
+    items_buf = io.StringIO()
+    span = timedelta(days=365 * years).total_seconds()
+    origin = datetime.combine(until, datetime.min.time()) - timedelta(seconds=span)
+    total = counts['orders']
+    material_cache: Dict[int, Tuple[str, str, str]] = {}
+    # rnd() вместо randint/randrange: генерация - основная доля времени загрузки на --scale 4
+    rnd = rng.random
+    managers = counts['managers']
+    materials = counts['materials']
+    for index in range(start, stop):
+        order_id = index + 1
+        created_at = origin + timedelta(seconds=span * index / total + rnd() * 60)
+        age_days = (until - created_at.date()).days
+        created_by = 2 + int(rnd() * managers)
+        items = []
+        for _ in range(1 + int(rnd() * MAX_ITEMS_PER_ORDER)):
+            material_index = int(rnd() * materials)
+            attrs = material_cache.get(material_index)
+            if attrs is None:
+                attrs = material_cache.setdefault(material_index, material_attrs(seed, material_index))
+            quantity = 1 + int(rnd() * 200)
+            if age_days > 30:
+                completed = quantity
+            elif age_days > 7:
+                completed = int(rnd() * (quantity + 1))
+            else:
+                completed = 0 if rnd() < 0.7 else int(rnd() * (quantity + 1))
+            items.append((attrs, quantity, completed))
+        total_quantity = sum(i[1] for i in items)
+        total_completed = sum(i[2] for i in items)
+        if total_completed >= total_quantity:
+            status = 'shipped' if age_days > 60 else 'completed'
+        elif total_completed > 0:
+            status = 'in_progress'
+        else:
+            status = 'created'
+        updated_at = created_at + timedelta(days=min(age_days, int(rnd() * 31)))
+        orders_buf.write(f'{order_id}\tORD-{order_id:08d}\t{status}\t{created_by}\t{fmt_ts(created_at)}\t{fmt_ts(updated_at)}\n')
+        # id позиции вычисляется из id заявки, а не берётся из последовательности: порции грузятся в случайном порядке
+        for position, ((name, size, color), quantity, completed) in enumerate(items):
+            item_id = index * MAX_ITEMS_PER_ORDER + position + 1
+            items_buf.write(f'{item_id}\t{order_id}\t{name}\t{quantity}\t{size}\t{color}\t{completed}\t{fmt_ts(created_at)}\n')
+    orders_buf.seek(0)
+    items_buf.seek(0)
+    return {
+        'orders (id, order_number, status, created_by, created_at, updated_at)': orders_buf,
+        'order_items (id, order_id, material, quantity, size, color, completed_quantity, created_at)': items_buf,
+    }
+
+
+def gen_inventory(seed: int, counts: Dict[str, int], start: int, stop: int, until: date, years: int) -> Dict[str, io.StringIO]:
+    rng = random.Random(f'{seed}:inventory:{start}')
+    buf = io.StringIO()
+    span = timedelta(days=365 * years).total_seconds()
+    origin = datetime.combine(until, datetime.min.time()) - timedelta(seconds=span)
+    total = counts['inventory']
+    first_user = counts['managers'] + 2
+    last_user = first_user + counts['workers'] - 1
+    rnd = rng.random
+    materials = counts['materials']
+    workers = last_user - first_user + 1
+    for index in range(start, stop):
+        created_at = origin + timedelta(seconds=span * index / total + rnd() * 60)
+        material_id = 1 + int(rnd() * materials)
+        note = NOTES[int(rnd() * len(NOTES))]
+        change = 10 + int(rnd() * 491) if note == 'Поступление' else -1 - int(rnd() * 100)
+        updated_by = first_user + int(rnd() * workers)
+        buf.write(f'{index + 1}\t{material_id}\t{change}\t{updated_by}\t{note}\t{fmt_ts(created_at)}\n')
+    buf.seek(0)
+    return {'material_inventory (id, material_id, quantity_change, updated_by, note, created_at)': buf}
+
+
+def gen_schedule(seed: int, counts: Dict[str, int], start: int, stop: int, until: date, years: int) -> Dict[str, io.StringIO]:
+    '''Одна порция — диапазон работников [start, stop) за весь период'''
+    rng = random.Random(f'{seed}:schedule:{start}')
+    buf = io.StringIO()
+    first_user = counts['managers'] + 2
+    origin = until - timedelta(days=365 * years)
+    days = [origin + timedelta(days=d) for d in range((until - origin).days)]
+    workdays = [d.isoformat() for d in days if d.weekday() < 5]
+    rnd = rng.random
+    hours = (4, 6, 8, 8, 8, 10, 12)
+    for index in range(start, stop):
+        user_id = first_user + index
+        for day, work_date in enumerate(workdays):
+            if rnd() < 0.08:
+                continue
+            buf.write(f'{index * len(workdays) + day + 1}\t{user_id}\t{work_date}\t{hours[int(rnd() * len(hours))]}\n')
+    buf.seek(0)
+    return {'schedule (id, user_id, work_date, hours)': buf}
+
+
+GENERATORS = {
+    'users': gen_users,
+    'sections': gen_sections,
+    'materials': gen_materials,
+    'orders': gen_orders,
+    'inventory': gen_inventory,
+    'schedule': gen_schedule,
+}
+
+_conn = None
+
+
+def get_conn():
+    global _conn
+    if _conn is None:
+        _conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+        with _conn.cursor() as cur:
+            # Загрузка не должна рассылать уведомления ленты изменений по каждой строке
+            cur.execute("SELECT set_config('oms.skip_notify', 'on', false)")
+    return _conn
+
+
+def load_chunk(task: Tuple[str, Tuple[Any, ...]]) -> int:
+    name, args = task
+    buffers = GENERATORS[name](*args)
+    conn = get_conn()
+    cur = conn.cursor()
+    rows = 0
+    for target, buf in buffers.items():
+        cur.copy_expert(f'COPY {SCHEMA}.{target} FROM STDIN', buf)
+        rows += cur.rowcount
+    conn.commit()
+    cur.close()
+    return rows
+
+
+def chunked(name: str, total: int, step: int, extra: Tuple[Any, ...] = ()) -> List[Tuple[str, Tuple[Any, ...]]]:
+    return [(name, extra[:2] + (start, min(start + step, total)) + extra[2:]) for start in range(0, total, step)]
+
+
+def defer_constraints(cur: Any, tables: List[str]) -> List[str]:
+    '''Снимает внешние ключи, вторичные индексы и пользовательские триггеры на время COPY.
+
+    Построчная проверка FK, поддержка индексов и trg_*_notify_change на каждой строке - основная цена загрузки
+    помимо генерации; после загрузки индексы строятся, а FK проверяются одним проходом по таблице.
+    Возвращает команды восстановления в порядке выполнения.
+    '''
+    names = [f'{SCHEMA}.{t}' for t in tables]
+    cur.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype = 'f' AND conrelid = ANY(%s::regclass[])
+    """, (names,))
+    foreign_keys = cur.fetchall()
+    cur.execute("""
+        SELECT format('%%I.%%I', i.schemaname, i.indexname), i.indexdef
+        FROM pg_indexes i
+        JOIN pg_class c ON c.relname = i.indexname AND c.relnamespace = i.schemaname::regnamespace
+        WHERE i.schemaname = %s AND i.tablename = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = c.oid)
+    """, (SCHEMA, tables))
+    indexes = cur.fetchall()
+
+    for table, name, _ in foreign_keys:
+        cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+    for name, _ in indexes:
+        cur.execute(f'DROP INDEX {name}')
+    for table in names:
+        cur.execute(f'ALTER TABLE {table} DISABLE TRIGGER USER')
+
+    restore = [definition for _, definition in indexes]
+    restore += [f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}' for table, name, definition in foreign_keys]
+    restore += [f'ALTER TABLE {table} ENABLE TRIGGER USER' for table in names]
+    # Триггеры trg_*_data_version не срабатывали: сдвигаем счётчики, чтобы кэши по ним (V0017) не пережили загрузку
+    cur.execute("SELECT format('%%I.%%I', schemaname, sequencename) FROM pg_sequences "
+                "WHERE schemaname = %s AND sequencename LIKE '%%\\_data\\_version'", (SCHEMA,))
+    restore += [f"SELECT nextval('{name}')" for (name,) in cur.fetchall()]
+    return restore
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Детерминированное заполнение БД тестовыми данными')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--until', type=date.fromisoformat, default=date(2026, 1, 1))
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--truncate', action='store_true', help='очистить таблицы перед загрузкой')
+    args = parser.parse_args()
+
+    counts = counts_for(args.scale)
+    conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    cur = conn.cursor()
+    tables = ['schedule', 'material_inventory', 'order_items', 'orders', 'materials', 'material_sections', 'users']
+    # Архив и производные таблицы очищаются вместе с рабочими: после RESTART IDENTITY те же id и номера ORD-...
+    # выдаются заново и конфликтовали бы с уже лежащими в архиве
+    derived = ['orders_archive', 'order_items_archive', 'material_inventory_archive', 'defects', 'defect_rollups',
+               'audit_log', 'idempotency_keys']
+
+    if args.truncate:
+        cur.execute(f"TRUNCATE {', '.join(f'{SCHEMA}.{t}' for t in tables + derived)} RESTART IDENTITY CASCADE")
+        conn.commit()
+    else:
+        cur.execute(f'SELECT EXISTS (SELECT 1 FROM {SCHEMA}.orders) OR EXISTS (SELECT 1 FROM {SCHEMA}.orders_archive) OR EXISTS (SELECT 1 FROM {SCHEMA}.materials) OR EXISTS (SELECT 1 FROM {SCHEMA}.users WHERE id > 1)')
+        if cur.fetchone()[0]:
+            print('Таблицы не пусты, запустите с --truncate', file=sys.stderr)
+            return 1
+        cur.execute(f'DELETE FROM {SCHEMA}.users')
+        conn.commit()
+
+    common = (args.seed, counts)
+    dated = (args.seed, counts, args.until, args.years)
+    # Этапы идут по порядку внешних ключей, порции внутри этапа загружаются параллельно
+    stages = [
+        [('users', common), ('sections', common)],
+        chunked('materials', counts['materials'], CHUNK_ROWS, common),
+        chunked('orders', counts['orders'], CHUNK_ROWS // 4, dated)
+        + chunked('inventory', counts['inventory'], CHUNK_ROWS, dated)
+        + chunked('schedule', counts['workers'], 50, dated),
+    ]
+
+    started = time.monotonic()
+    restore = defer_constraints(cur, tables)
+    conn.commit()
+    total_rows = 0
+    try:
+        with Pool(args.jobs) as pool:
+            for stage in stages:
+                total_rows += sum(pool.imap_unordered(load_chunk, stage))
+    finally:
+        # Восстанавливаем и при ошибке загрузки: схема не должна остаться без FK и индексов
+        conn.rollback()
+        for statement in restore:
+            cur.execute(statement)
+        conn.commit()
+
+    for table in tables:
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('{SCHEMA}.{table}', 'id'), (SELECT MAX(id) FROM {SCHEMA}.{table}))")
+    conn.commit()
+    conn.autocommit = True
+    for table in tables:
+        cur.execute(f'ANALYZE {SCHEMA}.{table}')
+    cur.close()
+    conn.close()
+
+    print(f'Загружено {total_rows} строк за {time.monotonic() - started:.1f} с')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
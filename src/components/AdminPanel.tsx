@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import { Tabs, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import Icon from '@/components/ui/icon';
 import { toast } from 'sonner';
+import { useChangeFeed } from '@/hooks/use-change-feed';
 import UsersTab from '@/components/admin/UsersTab';
 import MaterialsTab from '@/components/admin/MaterialsTab';
 import SectionsTab from '@/components/admin/SectionsTab';
@@ -54,6 +55,11 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
     loadSections();
   }, []);
 
+  // Лента передаёт только остатки, добавление и удаление материалов: после правки карточки перечитываем сами
+  const feedLive = useChangeFeed((tables) => {
+    if (!tables || tables.has('materials')) loadMaterials();
+  });
+
   const loadUsers = async () => {
     try {
       const response = await fetch(`${USERS_API}?include_passwords=true`);
@@ -94,7 +100,7 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
     try {
       const response = await fetch(USERS_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify(newUser)
       });
 
@@ -115,7 +121,7 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
     try {
       await fetch(USERS_API, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ id: userId })
       });
       toast.success('Пользователь удален');
@@ -135,13 +141,13 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
     try {
       const response = await fetch(MATERIALS_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify(newMaterial)
       });
 
       if (response.ok) {
         toast.success('Материал добавлен');
-        loadMaterials();
+        if (!feedLive) loadMaterials();
       }
     } catch (error) {
       toast.error('Ошибка добавления материала');
@@ -160,7 +166,7 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
     try {
       const response = await fetch(MATERIALS_API, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify(material)
       });
 
@@ -180,12 +186,13 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
 
     try {
       const response = await fetch(`${MATERIALS_API}?id=${id}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: { 'X-User-Id': String(user.id) }
       });
 
       if (response.ok) {
         toast.success('Материал удалён');
-        loadMaterials();
+        if (!feedLive) loadMaterials();
       }
     } catch (error) {
       toast.error('Ошибка удаления материала');
@@ -202,7 +209,7 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
     try {
       const response = await fetch(SECTIONS_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify(newSection)
       });
 
@@ -223,7 +230,7 @@ export default function AdminPanel({ user, onLogout }: AdminPanelProps) {
     try {
       await fetch(SECTIONS_API, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ id: sectionId })
       });
       toast.success('Раздел удален');
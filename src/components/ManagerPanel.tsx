@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import { Tabs, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import Icon from '@/components/ui/icon';
 import { toast } from 'sonner';
+import { useChangeFeed } from '@/hooks/use-change-feed';
 import OrdersSection from './manager/OrdersSection';
 import InventorySection from './manager/InventorySection';
 import { playNotificationSound, getStatusColor, getStatusText, printOrder, printInventory } from './manager/utils';
@@ -60,6 +61,11 @@ export default function ManagerPanel({ user, onLogout }: ManagerPanelProps) {
     loadMaterials();
   }, []);
 
+  const feedLive = useChangeFeed((tables) => {
+    if (!tables || tables.has('orders') || tables.has('order_items')) loadOrders();
+    if (!tables || tables.has('materials')) loadMaterials();
+  });
+
   const loadOrders = async () => {
     try {
       const response = await fetch(ORDERS_API);
@@ -90,7 +96,7 @@ export default function ManagerPanel({ user, onLogout }: ManagerPanelProps) {
     try {
       const response = await fetch(ORDERS_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ ...newOrder, created_by: user.id })
       });
 
@@ -99,7 +105,10 @@ export default function ManagerPanel({ user, onLogout }: ManagerPanelProps) {
         playNotificationSound();
         setDialogOpen(false);
         setNewOrder({ order_number: '', material: '', quantity: 0, size: '', color: '' });
-        loadOrders();
+        if (!feedLive) loadOrders();
+      } else {
+        const data = await response.json();
+        toast.error(data.error || 'Ошибка создания заявки');
       }
     } catch (error) {
       toast.error('Ошибка создания заявки');
@@ -113,12 +122,13 @@ export default function ManagerPanel({ user, onLogout }: ManagerPanelProps) {
 
     try {
       const response = await fetch(`${ORDERS_API}?id=${orderId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: { 'X-User-Id': String(user.id) }
       });
 
       if (response.ok) {
         toast.success('Заявка удалена');
-        loadOrders();
+        if (!feedLive) loadOrders();
       }
     } catch (error) {
       toast.error('Ошибка удаления заявки');
@@ -129,11 +139,11 @@ export default function ManagerPanel({ user, onLogout }: ManagerPanelProps) {
     try {
       await fetch(MATERIALS_API, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ id: materialId, quantity_change: change, updated_by: user.id })
       });
       toast.success('Остатки обновлены');
-      loadMaterials();
+      if (!feedLive) loadMaterials();
     } catch (error) {
       toast.error('Ошибка обновления остатков');
     }
@@ -144,12 +154,13 @@ export default function ManagerPanel({ user, onLogout }: ManagerPanelProps) {
 
     try {
       const response = await fetch(`${MATERIALS_API}?id=${materialId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: { 'X-User-Id': String(user.id) }
       });
 
       if (response.ok) {
         toast.success('Материал удалён');
-        loadMaterials();
+        if (!feedLive) loadMaterials();
       }
     } catch (error) {
       toast.error('Ошибка удаления материала');
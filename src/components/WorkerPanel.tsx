@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import { Tabs, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import Icon from '@/components/ui/icon';
 import { toast } from 'sonner';
+import { useChangeFeed } from '@/hooks/use-change-feed';
 import OrdersTab from '@/components/worker/OrdersTab';
 import InventoryTab from '@/components/worker/InventoryTab';
 import DefectsTab from '@/components/worker/DefectsTab';
@@ -69,10 +70,14 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
     loadOrders();
     loadMaterials();
     loadSchedule();
-    const interval = setInterval(loadOrders, 10000);
-    return () => clearInterval(interval);
   }, []);
 
+  // Вместо опроса раз в 10 с - лента изменений; опрос остаётся запасным путём, пока лента недоступна
+  const feedLive = useChangeFeed((tables) => {
+    if (!tables || tables.has('orders') || tables.has('order_items')) loadOrders();
+    if (tables?.has('materials')) loadMaterials();
+  }, 10000);
+
   useEffect(() => {
     loadSchedule();
   }, [currentMonth]);
@@ -119,7 +124,7 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
     try {
       await fetch(SCHEDULE_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({
           user_id: userId,
           work_date: date,
@@ -138,7 +143,7 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
     try {
       await fetch(SCHEDULE_API, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ id: scheduleId, hours })
       });
       toast.success('Часы обновлены');
@@ -206,12 +211,12 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
     try {
       await fetch(ORDERS_API, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ id: order.id, completed_quantity: newCompleted })
       });
 
       toast.success('Прогресс обновлен');
-      loadOrders();
+      if (!feedLive) loadOrders();
     } catch (error) {
       toast.error('Ошибка обновления');
     }
@@ -221,11 +226,11 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
     try {
       await fetch(ORDERS_API, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ id: orderId, status: 'shipped' })
       });
       toast.success('Заявка отправлена');
-      loadOrders();
+      if (!feedLive) loadOrders();
     } catch (error) {
       toast.error('Ошибка обновления статуса');
     }
@@ -236,12 +241,13 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
 
     try {
       const response = await fetch(`${ORDERS_API}?id=${orderId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: { 'X-User-Id': String(user.id) }
       });
 
       if (response.ok) {
         toast.success('Заявка удалена');
-        loadOrders();
+        if (!feedLive) loadOrders();
       }
     } catch (error) {
       toast.error('Ошибка удаления заявки');
@@ -253,12 +259,13 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
 
     try {
       const response = await fetch(`${MATERIALS_API}?id=${materialId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: { 'X-User-Id': String(user.id) }
       });
 
       if (response.ok) {
         toast.success('Материал удалён');
-        loadMaterials();
+        if (!feedLive) loadMaterials();
       }
     } catch (error) {
       toast.error('Ошибка удаления материала');
@@ -269,11 +276,11 @@ export default function WorkerPanel({ user, onLogout }: WorkerPanelProps) {
     try {
       await fetch(MATERIALS_API, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': String(user.id) },
         body: JSON.stringify({ id: materialId, quantity_change: change, updated_by: user.id })
       });
       toast.success('Остатки обновлены');
-      loadMaterials();
+      if (!feedLive) loadMaterials();
     } catch (error) {
       toast.error('Ошибка обновления остатков');
     }
@@ -0,0 +1,69 @@
+import { useEffect, useRef, useState } from 'react';
+import funcUrls from '../../backend/func2url.json';
+
+// Адрес появляется в func2url.json после публикации функции backend/feed
+const FEED_API: string | undefined = (funcUrls as Record<string, string>).feed;
+const RETRY_DELAY = 10000;
+
+type ChangeHandler = (tables: Set<string> | null) => void;
+
+// Лента изменений (long-poll backend/feed): onChange получает изменённые таблицы (orders, order_items, materials),
+// null - перечитать всё. Без ленты или при её ошибке - опрос раз в fallbackInterval мс (без опроса, если не задан).
+// Возвращает true, пока лента работает: свои записи придут через неё, перечитывать после них не нужно.
+export function useChangeFeed(onChange: ChangeHandler, fallbackInterval?: number) {
+  const handler = useRef(onChange);
+  handler.current = onChange;
+  const [live, setLive] = useState(false);
+
+  useEffect(() => {
+    let stopped = false;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    const controller = new AbortController();
+    const sleep = (ms: number) => new Promise((resolve) => { timer = setTimeout(resolve, ms); });
+
+    const poll = async () => {
+      while (!stopped && fallbackInterval) {
+        await sleep(fallbackInterval);
+        if (!stopped) handler.current(null);
+      }
+    };
+
+    const listen = async () => {
+      let cursor = '';
+      while (!stopped) {
+        try {
+          const response = await fetch(`${FEED_API}?cursor=${encodeURIComponent(cursor)}`, { signal: controller.signal });
+          if (!response.ok) throw new Error(`feed ${response.status}`);
+          const data = await response.json();
+          if (cursor && data.reset) {
+            handler.current(null);
+          } else if (data.events.length) {
+            handler.current(new Set(data.events.map((event: { table: string }) => event.table)));
+          }
+          cursor = data.cursor;
+          setLive(true);
+        } catch (error) {
+          if (stopped) return;
+          // Пока лента недоступна, данные обновляются опросом; курсор сохраняется, пропущенное придёт после восстановления
+          setLive(false);
+          if (fallbackInterval) handler.current(null);
+          await sleep(fallbackInterval || RETRY_DELAY);
+        }
+      }
+    };
+
+    if (FEED_API) {
+      listen();
+    } else {
+      poll();
+    }
+
+    return () => {
+      stopped = true;
+      controller.abort();
+      clearTimeout(timer);
+    };
+  }, [fallbackInterval]);
+
+  return live;
+}